@@ -0,0 +1,15 @@
+"""gunicorn settings, read from the working directory by default."""
+import os
+import shutil
+import tempfile
+
+
+# Workers add up their request metrics through files in this directory,
+# see main_app/metrics.py.
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'medical_app_metrics'))
+
+
+def on_starting(server):
+    """Start the metrics from zero, without files of earlier servers."""
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['METRICS_DIR'], exist_ok=True)
@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from django.utils.safestring import mark_safe
 
-from .models import Disease, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment, User
+from .models import Disease, DiseaseSymptom, GeographicalArea, Organ, OutgoingEmail, Symptom, Treatment, User
+from .templatetags.images import responsive_image
+from .writers import set_disease_symptoms
 
 
 class DiseaseSymptomInline(admin.TabularInline):
@@ -18,7 +19,9 @@ class OrganModelAdmin(admin.ModelAdmin):
     readonly_fields = ('get_image',)
 
     def get_image(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="150" height="150">')
+        if not obj.image:
+            return '-'
+        return responsive_image(obj, sizes='150px', width=150, height=150)
 
     get_image.short_description = 'image'
 
@@ -43,7 +46,9 @@ class GeographicalAreaModelAdmin(admin.ModelAdmin):
     readonly_fields = ('get_image',)
 
     def get_image(self, obj):
-        return mark_safe(f'<img src={obj.image.url} width="150" height="150">')
+        if not obj.image:
+            return '-'
+        return responsive_image(obj, sizes='150px', width=150, height=150)
 
     get_image.short_description = 'image'
 
@@ -57,6 +62,19 @@ class DiseaseModelAdmin(admin.ModelAdmin):
     inlines = (DiseaseSymptomInline,)
     save_on_top = True
 
+    def save_formset(self, request, form, formset, change):
+        """Write the symptom rows of the inline with the bulk write path."""
+        if formset.model is not DiseaseSymptom:
+            return super().save_formset(request, form, formset, change)
+        # Only fills new/changed/deleted_objects for the admin change message.
+        formset.save(commit=False)
+        rows = [
+            (inline.cleaned_data['symptom'], inline.cleaned_data['symptom_frequency'])
+            for inline in formset.forms
+            if inline.cleaned_data.get('symptom') and not inline.cleaned_data.get('DELETE')
+        ]
+        set_disease_symptoms(form.instance, rows)
+
 
 class DiseaseSymptomModelAdmin(admin.ModelAdmin):
     """Disease symptom model"""
@@ -65,10 +83,18 @@ class DiseaseSymptomModelAdmin(admin.ModelAdmin):
     search_fields = ('disease', 'symptom', 'symptom_frequency')
 
 
+class OutgoingEmailModelAdmin(admin.ModelAdmin):
+    """Queued email model"""
+    list_display = ('subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
+
+
 admin.site.register(Organ, OrganModelAdmin)
 admin.site.register(Symptom, SymptomModelAdmin)
 admin.site.register(Treatment, TreatmentModelAdmin)
 admin.site.register(GeographicalArea, GeographicalAreaModelAdmin)
 admin.site.register(Disease, DiseaseModelAdmin)
 admin.site.register(DiseaseSymptom, DiseaseSymptomModelAdmin)
+admin.site.register(OutgoingEmail, OutgoingEmailModelAdmin)
 admin.site.register(User, UserAdmin)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import condition
+from django.views.generic import View
+
+from .cards import get_card
+from .models import Disease, GeographicalArea, Organ, Symptom, Treatment
+from .pagination import is_bigint
+from .typeahead import get_prefix_index
+from .versioning import (
+    GENERATION, catalog_key, disease_version_name, get_last_modified,
+    object_version_name, table_version_name
+)
+
+
+def image_url(image):
+    return image.url if image else None
+
+
+def disease_summary(disease):
+    return {'id': disease.pk, 'name': disease.name}
+
+
+def symptom_data(symptom):
+    return {'id': symptom.pk, 'name': symptom.name, 'affected_organ': symptom.affected_organ_id}
+
+
+def organ_data(organ):
+    return {'id': organ.pk, 'name': organ.name, 'description': organ.description, 'image': image_url(organ.image)}
+
+
+def area_data(area):
+    return {'id': area.pk, 'area': area.area, 'image': image_url(area.image)}
+
+
+def treatment_data(treatment):
+    return {'id': treatment.pk, 'treatment': treatment.treatment}
+
+
+class ApiView(View):
+    """Read-only JSON endpoint answering conditional GETs from versions.
+
+    Subclasses return the response data from ``get_data``. The ETag, the
+    Last-Modified header and the cache key of the encoded body are built
+    from the versions named by ``get_version_names`` and the request path,
+    so an unchanged resource answers 304, or 200 from the cache, without
+    running the queries for the body.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    cache_timeout = 60 * 60 * 24
+
+    def get_version_names(self):
+        raise NotImplementedError
+
+    def get_data(self):
+        raise NotImplementedError
+
+    def get_etag(self, request, *args, **kwargs):
+        return hashlib.sha1(self.cache_key.encode()).hexdigest()
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return get_last_modified(GENERATION, *self.get_version_names())
+
+    def dispatch(self, request, *args, **kwargs):
+        path = hashlib.sha1(request.get_full_path().encode()).hexdigest()
+        self.cache_key = catalog_key('api', self.get_version_names(), path)
+        view = condition(etag_func=self.get_etag, last_modified_func=self.get_last_modified)(super().dispatch)
+        return view(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        content = cache.get(self.cache_key)
+        if content is None:
+            content = json.dumps(self.get_data(), cls=DjangoJSONEncoder).encode()
+            cache.set(self.cache_key, content, self.cache_timeout)
+        return HttpResponse(content, content_type='application/json')
+
+
+class ApiListView(ApiView):
+    """All objects of a model ordered by primary key, by pages of ``paginate_by``.
+
+    The next page starts after the last primary key of the previous one,
+    given as the ``after`` parameter.
+    """
+
+    model = None
+    queryset = None
+    serializer = None
+    paginate_by = 100
+
+    def get_version_names(self):
+        return [table_version_name(self.model)]
+
+    def get_queryset(self):
+        queryset = self.queryset if self.queryset is not None else self.model.objects.all()
+        return queryset.order_by('pk')
+
+    def get_data(self):
+        try:
+            after = int(self.request.GET.get('after', 0))
+        except ValueError:
+            after = None
+        if not is_bigint(after):
+            raise Http404('Invalid cursor')
+        objects = list(self.get_queryset().filter(pk__gt=after)[:self.paginate_by + 1])
+        has_next = len(objects) > self.paginate_by
+        objects = objects[:self.paginate_by]
+        next_url = f'{self.request.path}?after={objects[-1].pk}' if has_next else None
+        return {'results': [self.serializer(obj) for obj in objects], 'next': next_url}
+
+
+class ApiDetailView(ApiView):
+    """One object of a model by its primary key."""
+
+    model = None
+    queryset = None
+    serializer = None
+
+    def get_version_names(self):
+        return [object_version_name(self.model, self.kwargs['pk'])]
+
+    def get_queryset(self):
+        return self.queryset if self.queryset is not None else self.model.objects.all()
+
+    def get_data(self):
+        try:
+            obj = self.get_queryset().get(pk=self.kwargs['pk'])
+        except self.model.DoesNotExist:
+            raise Http404(f'No {self.model._meta.verbose_name} found')
+        return self.serializer(obj)
+
+
+class DiseaseApiListView(ApiListView):
+    model = Disease
+    queryset = Disease.objects.only('pk', 'name')
+    serializer = staticmethod(disease_summary)
+
+
+class DiseaseApiDetailView(ApiDetailView):
+    model = Disease
+
+    def get_version_names(self):
+        return [disease_version_name(self.kwargs['pk']), 'references']
+
+    def get_data(self):
+        card = get_card(self.kwargs['pk'])
+        if card is None:
+            raise Http404('No disease found')
+        return card
+
+
+class SymptomApiListView(ApiListView):
+    model = Symptom
+    serializer = staticmethod(symptom_data)
+
+
+class SymptomApiDetailView(ApiDetailView):
+    model = Symptom
+    serializer = staticmethod(symptom_data)
+
+
+class OrganApiListView(ApiListView):
+    model = Organ
+    serializer = staticmethod(organ_data)
+
+
+class OrganApiDetailView(ApiDetailView):
+    model = Organ
+    serializer = staticmethod(organ_data)
+
+
+class GeographicalAreaApiListView(ApiListView):
+    model = GeographicalArea
+    serializer = staticmethod(area_data)
+
+
+class GeographicalAreaApiDetailView(ApiDetailView):
+    model = GeographicalArea
+    serializer = staticmethod(area_data)
+
+
+class TreatmentApiListView(ApiListView):
+    model = Treatment
+    serializer = staticmethod(treatment_data)
+
+
+class TreatmentApiDetailView(ApiDetailView):
+    model = Treatment
+    serializer = staticmethod(treatment_data)
+
+
+class TypeaheadView(View):
+    """Symptoms, organs or areas with a word starting with the ``q`` parameter.
+
+    Answered from an in-memory sorted index; once it is built only the
+    version of its table is read.
+    """
+
+    http_method_names = ['get', 'head', 'options']
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request, kind):
+        try:
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            limit = self.default_limit
+        limit = max(1, min(limit, self.max_limit))
+        matches = get_prefix_index(kind).complete(request.GET.get('q', ''), limit)
+        response = JsonResponse({'results': [{'id': pk, 'name': name} for pk, name in matches]})
+        response['Cache-Control'] = 'private, max-age=60'
+        return response
@@ -0,0 +1,45 @@
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.core.cache import cache
+
+from .versioning import versioned_key
+
+
+DOCTORS = 'Doctors'
+
+
+def user_groups_version_name(pk):
+    return f'user_groups:{pk}'
+
+
+def get_group_names(user):
+    """Return the names of the user's groups.
+
+    The names are loaded once per request (kept on the user object) and
+    cached across requests until the user's memberships or any group change.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_group_names'):
+        key = versioned_key('user_groups', [user_groups_version_name(user.pk), 'groups'], user.pk)
+        names = cache.get(key)
+        if names is None:
+            names = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, names, None)
+        user._group_names = names
+    return user._group_names
+
+
+def has_group(user, group_name):
+    return group_name in get_group_names(user)
+
+
+def is_doctor(user):
+    """Return True for members of the Doctors group and superusers."""
+    return user.is_superuser or has_group(user, DOCTORS)
+
+
+class DoctorsRequiredMixin(UserPassesTestMixin):
+    """Allow the view only to doctors and superusers."""
+
+    def test_func(self):
+        return is_doctor(self.request.user)
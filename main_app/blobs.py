@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import GeographicalArea, Organ, StoredBlob
+from .storage import TEMPORARY_DIR, name_hash
+
+
+# Models whose ``image`` and ``image_variants`` fields refer to blobs.
+IMAGE_MODELS = (Organ, GeographicalArea)
+
+
+def register_blob(name, size):
+    """Record a stored file, restarting the grace period of a known blob.
+
+    The storage calls it before it checks that the file exists. A garbage
+    collection which locked the blob first has deleted the row and the file
+    by then, so both are stored again; a later one skips the blob for the
+    grace period.
+    """
+    with transaction.atomic():
+        if not StoredBlob.objects.filter(name=name).update(created_at=timezone.now()):
+            StoredBlob.objects.get_or_create(name=name, defaults={'size': size})
+
+
+def variant_names(image_variants):
+    """Return the file names listed in an ``image_variants`` value."""
+    if not image_variants:
+        return set()
+    return {
+        path
+        for width, name, webp_name in json.loads(image_variants)['sizes']
+        for path in (name, webp_name) if path
+    }
+
+
+def image_names(obj):
+    """Return the names of all files an organ or area refers to."""
+    names = variant_names(obj.image_variants)
+    if obj.image:
+        names.add(obj.image.name)
+    return names
+
+
+def change_references(added=(), removed=()):
+    """Count new references to blobs and drop old ones.
+
+    Names outside the blob store (files uploaded before it) are ignored.
+    """
+    for names, delta in ((set(added) - set(removed), 1), (set(removed) - set(added), -1)):
+        names = [name for name in names if name_hash(name)]
+        if names:
+            StoredBlob.objects.filter(name__in=names).update(references=F('references') + delta)
+
+
+def recount_references():
+    """Recompute every reference count from the image fields."""
+    counts = {}
+    for model in IMAGE_MODELS:
+        for obj in model.objects.only('image', 'image_variants').iterator():
+            for name in image_names(obj):
+                counts[name] = counts.get(name, 0) + 1
+    with transaction.atomic():
+        StoredBlob.objects.exclude(name__in=counts).update(references=0)
+        for name, count in counts.items():
+            StoredBlob.objects.filter(name=name).update(references=count)
+
+
+def collect_garbage(grace=timedelta(hours=1), dry_run=False):
+    """Delete unreferenced blobs older than ``grace``, return their names.
+
+    The grace period keeps blobs of uploads whose object is being saved.
+    Leftover temporary files of interrupted uploads are deleted as well.
+    """
+    deadline = timezone.now() - grace
+    deleted = []
+    with transaction.atomic():
+        blobs = StoredBlob.objects.select_for_update().filter(references__lte=0, created_at__lte=deadline)
+        for blob in blobs:
+            deleted.append(blob.name)
+            if not dry_run:
+                default_storage.delete(blob.name)
+                blob.delete()
+
+    if not dry_run and default_storage.exists(TEMPORARY_DIR):
+        directories, files = default_storage.listdir(TEMPORARY_DIR)
+        for name in files:
+            path = default_storage.path(f'{TEMPORARY_DIR}/{name}')
+            if os.path.getmtime(path) < time.time() - grace.total_seconds():
+                os.remove(path)
+    return deleted
@@ -0,0 +1,157 @@
+"""Denormalized disease cards: one precomputed JSON snapshot per disease.
+
+A card holds a disease with its symptoms ordered by frequency, its organs,
+geographical areas and treatments, so the details page, the export and
+the API read a disease with one primary key lookup instead of five
+queries.
+
+Every card records the versions of its disease (``GENERATION`` and
+``disease_version_name``) read before the snapshot was built. The signals
+which bump those versions make the card stale, and a stale or missing card
+is rebuilt by the next read; changes of shared symptoms, organs, areas and
+treatments delete the cards of the diseases referring to them. The
+``rebuild_disease_cards`` command builds all cards in bulk.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Disease, DiseaseCard, DiseaseSymptom
+from .versioning import GENERATION, disease_version_name, get_versions
+
+
+CARD_CHUNK_SIZE = 500
+
+# Lookups from DiseaseCard to the objects shown on a card, by model name.
+REFERENCE_LOOKUPS = {
+    'symptom': 'disease__symptoms',
+    'organ': 'disease__affected_organs',
+    'geographicalarea': 'disease__geographical_area',
+    'treatment': 'disease__treatment',
+}
+
+
+def card_queryset():
+    return Disease.objects.order_by('pk').prefetch_related(
+        'affected_organs',
+        'geographical_area',
+        'treatment',
+        Prefetch(
+            'diseasesymptom_set',
+            queryset=DiseaseSymptom.objects.select_related('symptom').order_by('-symptom_frequency', 'symptom__name'),
+            to_attr='symptoms_details'
+        )
+    )
+
+
+def pk_chunks(chunk_size=CARD_CHUNK_SIZE):
+    """Yield lists of disease ids in order, read by ranges (``pk > last``)."""
+    queryset = Disease.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def card_data(disease):
+    """Return a disease with its prefetched relations as a dict."""
+    return {
+        'id': disease.pk,
+        'name': disease.name,
+        'description': disease.description,
+        'symptoms': [
+            {'id': row.symptom_id, 'name': row.symptom.name, 'frequency': row.symptom_frequency}
+            for row in disease.symptoms_details
+        ],
+        'affected_organs': [{'id': organ.pk, 'name': organ.name} for organ in disease.affected_organs.all()],
+        'geographical_area': [{'id': area.pk, 'area': area.area} for area in disease.geographical_area.all()],
+        'treatment': [{'id': treatment.pk, 'treatment': treatment.treatment} for treatment in disease.treatment.all()],
+    }
+
+
+def current_versions(pks):
+    """Return the version stamp a fresh card of each disease has, by id."""
+    generation, *versions = get_versions(GENERATION, *(disease_version_name(pk) for pk in pks))
+    return {pk: f'{generation}:{version}' for pk, version in zip(pks, versions)}
+
+
+def store_cards(diseases, versions, replaced=None):
+    """Write the cards of prefetched diseases and return them by id.
+
+    The cards of the ``replaced`` disease ids, all of them by default, are
+    deleted first.
+    """
+    cards = {disease.pk: card_data(disease) for disease in diseases}
+    replaced = list(cards) if replaced is None else replaced
+    with transaction.atomic(savepoint=bool(replaced)):
+        if replaced:
+            DiseaseCard.objects.filter(disease_id__in=replaced).delete()
+        # A concurrent read may have stored the same card meanwhile.
+        DiseaseCard.objects.bulk_create([
+            DiseaseCard(disease_id=pk, versions=versions[pk], data=json.dumps(card))
+            for pk, card in cards.items()
+        ], ignore_conflicts=True)
+    return cards
+
+
+def refresh_cards(pks):
+    """Rebuild the cards of the given diseases and return them by id."""
+    pks = list(pks)
+    # Versions are read before the rows, so a change made meanwhile leaves the card stale.
+    versions = current_versions(pks)
+    return store_cards(card_queryset().filter(pk__in=pks), versions)
+
+
+def get_cards(pks):
+    """Return the cards of the given diseases by id, rebuilding stale ones.
+
+    Diseases which do not exist are missing from the result.
+    """
+    pks = [int(pk) for pk in pks]
+    versions = current_versions(pks)
+    cards, outdated = {}, []
+    for pk, stamp, data in DiseaseCard.objects.filter(disease_id__in=pks).values_list('disease_id', 'versions', 'data'):
+        if stamp == versions[pk]:
+            cards[pk] = json.loads(data)
+        else:
+            outdated.append(pk)
+    stale = [pk for pk in pks if pk not in cards]
+    if stale:
+        cards.update(store_cards(card_queryset().filter(pk__in=stale), versions, outdated))
+    return cards
+
+
+def get_card(pk):
+    """Return the card of a disease, or None if there is no such disease."""
+    return get_cards([pk]).get(int(pk))
+
+
+def card_chunks(chunk_size=CARD_CHUNK_SIZE):
+    """Yield lists of all cards ordered by disease id, one chunk at a time.
+
+    Every chunk costs two queries when its cards are fresh, however far
+    into the table it is, and only one chunk is held in memory.
+    """
+    for pks in pk_chunks(chunk_size):
+        cards = get_cards(pks)
+        yield [cards[pk] for pk in pks if pk in cards]
+
+
+def rebuild_cards(chunk_size=CARD_CHUNK_SIZE):
+    """Build the cards of all diseases and return how many were written."""
+    return sum(len(refresh_cards(pks)) for pks in pk_chunks(chunk_size))
+
+
+def cards_showing(model, pk):
+    """Return the ids of the cards showing the given symptom, organ, area or treatment."""
+    lookup = REFERENCE_LOOKUPS[model._meta.model_name]
+    return list(DiseaseCard.objects.filter(**{lookup: pk}).values_list('disease_id', flat=True))
+
+
+def drop_cards(pks):
+    """Delete the cards of the given diseases, to be rebuilt by their next read."""
+    DiseaseCard.objects.filter(disease_id__in=pks).delete()
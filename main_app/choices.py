@@ -0,0 +1,39 @@
+from .versioning import GENERATION, ProcessCache, table_version_name
+
+
+def _names(key):
+    return (GENERATION, table_version_name(key[0]))
+
+
+def _load_choices(key):
+    choices = [(obj.pk, str(obj)) for obj in key[0].objects.all()]
+    return choices, dict(choices)
+
+
+_choices = ProcessCache(_names, _load_choices)
+_rendered = ProcessCache(_names)
+
+
+def get_choices(model):
+    """Return ``(choices, labels)`` for all rows of a model.
+
+    ``choices`` is a list of (pk, str(obj)) pairs in the model's ordering
+    and ``labels`` maps primary keys to the same strings. Both are loaded
+    once per version of the model's table and shared by every form of
+    every request in the process.
+    """
+    return _choices.get((model,))
+
+
+def get_rendered(model, key, render):
+    """Return HTML built by ``render()`` for a model's choices.
+
+    The HTML is kept until the model's table changes; ``key`` tells apart
+    different renderings of the same choices.
+    """
+    return _rendered.get((model, key), lambda key: render())
+
+
+def reset_choices():
+    _choices.clear()
+    _rendered.clear()
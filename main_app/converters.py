@@ -0,0 +1,20 @@
+from .pagination import is_bigint
+
+
+class BigIntConverter:
+    """Path converter for primary keys: digits which fit a 64-bit integer column.
+
+    A longer number does not match the URL, so it answers 404 instead of
+    overflowing the query parameter.
+    """
+
+    regex = '[0-9]+'
+
+    def to_python(self, value):
+        value = int(value)
+        if not is_bigint(value):
+            raise ValueError(value)
+        return value
+
+    def to_url(self, value):
+        return str(value)
@@ -0,0 +1,25 @@
+import json
+
+from .cards import card_chunks
+
+
+EXPORT_CHUNK_SIZE = 500
+
+
+def disease_record(card):
+    """Return the exported dict of a disease card."""
+    return {
+        'id': card['id'],
+        'name': card['name'],
+        'description': card['description'],
+        'symptoms': [{'name': row['name'], 'frequency': row['frequency']} for row in card['symptoms']],
+        'affected_organs': [organ['name'] for organ in card['affected_organs']],
+        'geographical_area': [area['area'] for area in card['geographical_area']],
+        'treatment': [treatment['treatment'] for treatment in card['treatment']],
+    }
+
+
+def export_ndjson(chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the catalog as NDJSON, one encoded chunk of lines at a time."""
+    for chunk in card_chunks(chunk_size):
+        yield ''.join(json.dumps(disease_record(card), ensure_ascii=False) + '\n' for card in chunk).encode()
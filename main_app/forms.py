@@ -1,11 +1,79 @@
 from django import forms
+from django.forms.utils import flatatt
+from django.urls import reverse_lazy
+from django.utils.html import conditional_escape, format_html, format_html_join
+from django.utils.safestring import mark_safe
 
+from .choices import get_choices, get_rendered
 from .models import (
     Disease, DiseaseSymptom, GeographicalArea, 
     Organ, Symptom, Treatment, User
 )
 
 
+class CachedChoicesMixin:
+    """Render model choices from the process-wide choices cache.
+
+    The widget is rendered without a selection once per version of the
+    choices' table and reused by every form; selected values are marked by
+    adding an attribute after the value in the cached HTML.
+    """
+
+    def choices_model(self):
+        return self.choices.queryset.model
+
+    def mark_selected(self, html, name, value):
+        raise NotImplementedError
+
+    def render(self, name, value, attrs=None, renderer=None):
+        html = self.render_unselected(name, attrs, renderer)
+        for item in self.format_value(value):
+            if item != '':
+                html = self.mark_selected(html, name, conditional_escape(item))
+        return mark_safe(html)
+
+
+class CachedSelect(CachedChoicesMixin, forms.Select):
+    """Select whose options are built once and shared by all its forms."""
+
+    def mark_selected(self, html, name, value):
+        option = f'<option value="{value}"'
+        return html.replace(option, option + ' selected', 1)
+
+    def render_unselected(self, name, attrs, renderer):
+        model = self.choices_model()
+        empty_label = getattr(self.choices, 'field', None) and self.choices.field.empty_label
+
+        def render_options():
+            choices = get_choices(model)[0]
+            blank = format_html('<option value="">{}</option>', empty_label) if empty_label is not None else ''
+            return blank + format_html_join('', '<option value="{}">{}</option>', choices)
+
+        options = get_rendered(model, ('options', empty_label), render_options)
+        return format_html(
+            '<select name="{}"{}>{}</select>',
+            name, flatatt(self.build_attrs(self.attrs, attrs)), mark_safe(options)
+        )
+
+
+class CachedCheckboxSelectMultiple(CachedChoicesMixin, forms.CheckboxSelectMultiple):
+    """Checkbox list rendered once per field name and attributes."""
+
+    def mark_selected(self, html, name, value):
+        checkbox = f'name="{conditional_escape(name)}" value="{value}"'
+        return html.replace(checkbox, checkbox + ' checked', 1)
+
+    def render_unselected(self, name, attrs, renderer):
+        model = self.choices_model()
+        final_attrs = self.build_attrs(self.attrs, attrs)
+
+        def render_checkboxes():
+            widget = forms.CheckboxSelectMultiple(self.attrs, choices=get_choices(model)[0])
+            return widget.render(name, None, attrs, renderer)
+
+        return get_rendered(model, ('checkboxes', name, tuple(sorted(final_attrs.items()))), render_checkboxes)
+
+
 class DiseaseCreateForm(forms.ModelForm):
     """Create new disease form"""
 
@@ -23,9 +91,9 @@ class DiseaseCreateForm(forms.ModelForm):
         widgets = {
             'name': forms.Textarea(attrs={'cols': 130, 'rows': 2}),
             'description': forms.Textarea(attrs={'cols': 130, 'rows': 5}),
-            'geographical_area': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'}),
-            'affected_organs': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'}),
-            'treatment': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'})
+            'geographical_area': CachedCheckboxSelectMultiple({'class': 'no-bullet-list'}),
+            'affected_organs': CachedCheckboxSelectMultiple({'class': 'no-bullet-list'}),
+            'treatment': CachedCheckboxSelectMultiple({'class': 'no-bullet-list'})
         }
 
 
@@ -41,7 +109,7 @@ class DiseaseCreateForm2(forms.ModelForm):
             'symptom_frequency': 'Symptom frequency'
         }
         widgets = {
-            'symptom': forms.Select(),
+            'symptom': CachedSelect(),
             'symptom_frequency': forms.Select()
         }
 
@@ -49,10 +117,43 @@ class DiseaseCreateForm2(forms.ModelForm):
 DiseaseFormSet = forms.formset_factory(DiseaseCreateForm2, extra=10)
 
 
+class TypeaheadSelectMultiple(forms.SelectMultiple):
+    """Text input with suggestions from the typeahead endpoint.
+
+    Only the selected choices are rendered (as checked checkboxes), so the
+    page does not grow with the number of choices.
+    """
+
+    template_name = 'typeahead_widget.html'
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.url = reverse_lazy('typeahead', args=[kind])
+
+    def optgroups(self, name, value, attrs=None):
+        labels = get_choices(self.choices.queryset.model)[1]
+        selected = [int(pk) for pk in value if pk.isdigit() and int(pk) in labels]
+        return [
+            (None, [self.create_option(name, pk, labels[pk], True, index, attrs=attrs)], index)
+            for index, pk in enumerate(selected)
+        ]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['url'] = self.url
+        return context
+
+
 class DiseaseSearchForm(forms.ModelForm):
     """Form to search the disease."""
 
     # all_areas = forms.BooleanField(label='All world', required=False)
+    min_frequency = forms.TypedChoiceField(
+        label='Minimum symptom frequency',
+        choices=DiseaseSymptom.SYMPTOM_FREQUENCY_CHOICES,
+        coerce=int,
+        required=False
+    )
 
     def __init__(self, *args, **kwargs):
         super(DiseaseSearchForm, self).__init__(*args, **kwargs)
@@ -70,9 +171,9 @@ class DiseaseSearchForm(forms.ModelForm):
             'geographical_area': 'Geographical Area'
         }
         widgets = {
-            'geographical_area': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'}),
-            'affected_organs': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'}),
-            'symptoms': forms.CheckboxSelectMultiple({'class': 'no-bullet-list'}),
+            'geographical_area': TypeaheadSelectMultiple('areas'),
+            'affected_organs': TypeaheadSelectMultiple('organs'),
+            'symptoms': TypeaheadSelectMultiple('symptoms'),
         }
 
 
@@ -0,0 +1,153 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+from .models import Disease
+from .versioning import ProcessCache, table_version_name
+
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Name matches count more than description matches.
+FIELD_WEIGHTS = {'name': 3, 'description': 1}
+
+# Minimal trigram similarity for a misspelled word to match a known one.
+FUZZY_THRESHOLD = 0.45
+
+
+def tokenize(text):
+    """Split text into lower-case words of two or more characters."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if len(token) > 1]
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TextIndex:
+    """Inverted text index over Disease.name and Disease.description.
+
+    Every word maps to a posting dict ``{disease_id: weighted term count}``
+    and every word trigram maps to the words containing it, which is used to
+    match misspelled query words against the vocabulary. Documents are only
+    kept as their weighted lengths; the terms of a document live in the
+    postings alone.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.grams = defaultdict(set)
+
+    @classmethod
+    def from_db(cls):
+        index = cls()
+        for pk, name, description in Disease.objects.values_list('pk', 'name', 'description').iterator():
+            index.add(pk, name, description)
+        return index
+
+    def add(self, disease_id, name, description):
+        """Index one disease, replacing its previous version if any."""
+        self.remove(disease_id)
+        terms = Counter()
+        for field, text in (('name', name), ('description', description)):
+            for token in tokenize(text):
+                terms[token] += FIELD_WEIGHTS[field]
+        for token, weight in terms.items():
+            if token not in self.postings:
+                for gram in trigrams(token):
+                    self.grams[gram].add(token)
+            self.postings[token][disease_id] = weight
+        self.lengths[disease_id] = sum(terms.values())
+
+    def remove(self, disease_id):
+        """Drop a disease from the postings, which are searched for it."""
+        if self.lengths.pop(disease_id, None) is None:
+            return
+        for token in [token for token, postings in self.postings.items() if disease_id in postings]:
+            postings = self.postings[token]
+            del postings[disease_id]
+            if not postings:
+                del self.postings[token]
+                for gram in trigrams(token):
+                    self.grams[gram].discard(token)
+
+    def similar(self, token):
+        """Return ``{word: similarity}`` for vocabulary words close to token."""
+        if token in self.postings:
+            return {token: 1.0}
+        grams = trigrams(token)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.grams.get(gram, ()))
+        matches = {}
+        for word, count in shared.items():
+            similarity = count / (len(grams) + len(trigrams(word)) - count)
+            if similarity >= FUZZY_THRESHOLD:
+                matches[word] = similarity
+        return matches
+
+    def search(self, query, limit=1000):
+        """Return disease ids matching the query, most relevant first."""
+        total = len(self.lengths)
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            for word, similarity in self.similar(token).items():
+                postings = self.postings[word]
+                idf = math.log(1 + total / len(postings))
+                for disease_id, weight in postings.items():
+                    scores[disease_id] += similarity * idf * weight / (weight + 1.2)
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [disease_id for disease_id, score in best]
+
+
+class SearchResults:
+    """Lazy sequence of Disease objects for a ranked list of ids.
+
+    Slicing loads only the requested diseases, so it can be handed to
+    Django's Paginator.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        ids = self.ids[index]
+        diseases = Disease.objects.in_bulk(ids)
+        return [diseases[pk] for pk in ids if pk in diseases]
+
+
+# Kept like the catalog index of index.py, by the version of the disease table.
+_indexes = ProcessCache(lambda key: (table_version_name(Disease),), lambda key: TextIndex.from_db())
+
+
+def get_text_index():
+    """Return the process-wide text index, (re)building it when it is stale."""
+    return _indexes.get()
+
+
+def reset_text_index():
+    """Drop the text index so the next use rebuilds it from the database."""
+    _indexes.clear()
+
+
+def update_text_index(func, *args):
+    """Apply an incremental change if the text index has been built already."""
+    _indexes.update(func, *args)
+
+
+def search_diseases(query):
+    """Return a lazy, relevance-ordered sequence of diseases for the query."""
+    return SearchResults(get_text_index().search(query))
+
+
+def advance_text_index(version):
+    """Record that the text index holds the change which produced ``version``."""
+    _indexes.advance(version)
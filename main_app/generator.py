@@ -0,0 +1,162 @@
+import itertools
+import random
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from .models import Disease, DiseaseCard, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment
+from .versioning import bump_generation
+
+
+PREFIXES = ['Acute', 'Chronic', 'Congenital', 'Idiopathic', 'Viral', 'Bacterial', 'Autoimmune', 'Hereditary']
+ROOTS = ['cardi', 'neur', 'gastr', 'hepat', 'nephr', 'derm', 'arthr', 'bronch', 'encephal', 'myel', 'oste', 'pancreat']
+SUFFIXES = ['itis', 'osis', 'opathy', 'algia', 'emia', 'oma', 'ectasia', 'plegia']
+ORGANS = ['Heart', 'Lung', 'Liver', 'Kidney', 'Brain', 'Stomach', 'Skin', 'Spleen', 'Pancreas', 'Bone', 'Eye', 'Ear']
+SIGNS = ['pain', 'swelling', 'rash', 'fever', 'itching', 'bleeding', 'numbness', 'weakness', 'cough', 'stiffness']
+PLACES = ['head', 'chest', 'abdomen', 'back', 'joint', 'skin', 'throat', 'limb', 'eye', 'ear']
+WORDS = (
+    'inflammation infection tissue chronic acute patient symptoms treatment blood cells organ caused by '
+    'virus bacteria immune response damage lesion disorder syndrome progressive severe mild onset risk '
+    'factors diagnosis therapy recovery complication affects children adults elderly commonly rarely'
+).split()
+
+CATALOG_MODELS = [Disease, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment]
+
+# Relative share of DiseaseSymptom.symptom_frequency values 0..5.
+FREQUENCY_WEIGHTS = [5, 10, 20, 30, 25, 10]
+
+
+class Rollback(Exception):
+    """Raised in ``transaction.atomic()`` to roll back a catalog generated for a measurement."""
+
+
+class CatalogGenerator:
+    """Deterministic synthetic catalog for load tests and benchmarks.
+
+    Symptom popularity follows a Zipf distribution, so a few symptoms (like
+    fever) appear in many diseases and most in a handful. Rows get explicit
+    primary keys and are written with bulk_create in batches, one
+    transaction per batch.
+    """
+
+    def __init__(self, seed=0, batch_size=5000, stdout=None):
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0) + 1
+
+    def create(self, model, objects):
+        """Bulk insert objects with explicit primary keys, return the keys."""
+        start = self.next_pk(model)
+        pks = []
+        for batch in chunks(objects, self.batch_size):
+            for pk, obj in enumerate(batch, start + len(pks)):
+                obj.pk = pk
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            pks += [obj.pk for obj in batch]
+        return pks
+
+    def text(self, low, high):
+        return ' '.join(self.random.choice(WORDS) for i in range(self.random.randint(low, high))).capitalize()
+
+    def generate(self, diseases=1000, symptoms=500, organs=40, areas=20, treatments=200, symptoms_per_disease=8):
+        """Add a synthetic catalog of the given size to the database."""
+        rnd = self.random
+        organ_ids = self.create(Organ, [
+            Organ(name=f'{rnd.choice(ORGANS)} {i}', description=self.text(10, 30), image='')
+            for i in range(organs)
+        ])
+        area_ids = self.create(GeographicalArea, [
+            GeographicalArea(area=f'Region {i}', image='') for i in range(areas)
+        ])
+        treatment_ids = self.create(Treatment, [
+            Treatment(treatment=f'{self.text(2, 6)} {i}') for i in range(treatments)
+        ])
+        # Symptom names are unique, so they are numbered by primary key.
+        first_symptom = self.next_pk(Symptom)
+        symptom_ids = self.create(Symptom, [
+            Symptom(
+                name=f'{rnd.choice(PLACES).capitalize()} {rnd.choice(SIGNS)} {first_symptom + i}',
+                affected_organ_id=rnd.choice(organ_ids) if rnd.random() < 0.8 else None
+            )
+            for i in range(symptoms)
+        ])
+        self.log(f'Created {organs} organs, {areas} areas, {treatments} treatments, {symptoms} symptoms.')
+
+        popularity = list(itertools.accumulate(1 / (rank + 10) for rank in range(1, len(symptom_ids) + 1)))
+        per_disease = min(symptoms_per_disease, len(symptom_ids))
+        start = self.next_pk(Disease)
+        for offset in range(0, diseases, self.batch_size):
+            count = min(self.batch_size, diseases - offset)
+            rows = {model: [] for model in (
+                Disease, DiseaseSymptom, Disease.affected_organs.through,
+                Disease.geographical_area.through, Disease.treatment.through,
+            )}
+            for pk in range(start + offset, start + offset + count):
+                name = f'{rnd.choice(PREFIXES)} {rnd.choice(ROOTS)}{rnd.choice(SUFFIXES)} {pk}'
+                rows[Disease].append(Disease(pk=pk, name=name, description=self.text(15, 60)))
+
+                chosen = set()
+                wanted = max(1, min(len(symptom_ids), round(rnd.triangular(1, 2 * per_disease, per_disease))))
+                while len(chosen) < wanted:
+                    chosen.add(rnd.choices(symptom_ids, cum_weights=popularity)[0])
+                frequencies = rnd.choices(range(6), weights=FREQUENCY_WEIGHTS, k=len(chosen))
+                rows[DiseaseSymptom] += [
+                    DiseaseSymptom(disease_id=pk, symptom_id=symptom_id, symptom_frequency=frequency)
+                    for symptom_id, frequency in zip(sorted(chosen), frequencies)
+                ]
+                rows[Disease.affected_organs.through] += [
+                    Disease.affected_organs.through(disease_id=pk, organ_id=organ_id)
+                    for organ_id in rnd.sample(organ_ids, min(len(organ_ids), rnd.randint(1, 3)))
+                ]
+                rows[Disease.geographical_area.through] += [
+                    Disease.geographical_area.through(disease_id=pk, geographicalarea_id=area_id)
+                    for area_id in rnd.sample(area_ids, min(len(area_ids), rnd.randint(1, 5)))
+                ]
+                rows[Disease.treatment.through] += [
+                    Disease.treatment.through(disease_id=pk, treatment_id=treatment_id)
+                    for treatment_id in rnd.sample(treatment_ids, min(len(treatment_ids), rnd.randint(0, 4)))
+                ]
+            with transaction.atomic():
+                for model, objects in rows.items():
+                    model.objects.bulk_create(objects)
+            self.log(f'Created {offset + count} of {diseases} diseases.')
+
+        reset_sequences()
+        bump_generation(CATALOG_MODELS)
+        return {'organs': organ_ids, 'areas': area_ids, 'treatments': treatment_ids, 'symptoms': symptom_ids}
+
+
+def chunks(items, size):
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+
+def reset_sequences():
+    """Move primary key sequences past the explicitly inserted keys."""
+    models = [Organ, GeographicalArea, Treatment, Symptom, Disease]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def clear_catalog():
+    """Delete the whole catalog without loading rows to send signals."""
+    tables = [
+        DiseaseCard, DiseaseSymptom, Disease.affected_organs.through, Disease.geographical_area.through,
+        Disease.treatment.through, Disease, Symptom, Treatment, GeographicalArea, Organ,
+    ]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in tables:
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+    bump_generation(CATALOG_MODELS)
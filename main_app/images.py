@@ -0,0 +1,89 @@
+import io
+import json
+import os
+
+from PIL import Image, features
+
+from django.core.files.base import ContentFile
+
+from .blobs import change_references, variant_names
+
+
+# Widths of the pre-sized copies: the admin shows images at 150px and the
+# list pages at up to 200px, 400px covers both on high density screens.
+VARIANT_WIDTHS = (150, 200, 400)
+THUMBNAILS_DIR = 'thumbnails'
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def variant_name(name, width, extension=None):
+    """Return the storage name of a pre-sized copy of an image."""
+    base, original_extension = os.path.splitext(name)
+    directory, stem = os.path.split(base)
+    return f'{directory}/{THUMBNAILS_DIR}/{stem}-{width}w{extension or original_extension}'
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    elif image_format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def make_variants(field_file, widths=VARIANT_WIDTHS):
+    """Write resized and WebP copies of an uploaded image.
+
+    Returns the description stored in the ``image_variants`` field: the
+    source name and width and ``[width, name, webp name]`` for every copy
+    narrower than the source. The WebP name is None when Pillow was built
+    without WebP support.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        image = Image.open(source)
+        image.load()
+    image_format = image.format if image.format in ('JPEG', 'PNG', 'GIF') else 'PNG'
+    if image.mode == 'P':
+        image = image.convert('RGBA')
+    webp = features.check('webp')
+
+    sizes = []
+    for width in sorted(widths):
+        if width >= image.width:
+            break
+        copy = image.copy()
+        copy.thumbnail((width, image.height * width // image.width or 1), Image.LANCZOS)
+        extension = None if image_format == image.format else '.png'
+        name = storage.save(variant_name(field_file.name, width, extension), _encode(copy, image_format))
+        webp_name = storage.save(variant_name(field_file.name, width, '.webp'), _encode(copy, 'WEBP')) if webp else None
+        sizes.append([width, name, webp_name])
+    return {'source': field_file.name, 'width': image.width, 'sizes': sizes}
+
+
+def load_variants(obj):
+    """Return the variants description of an object, None if out of date."""
+    if not obj.image or not obj.image_variants:
+        return None
+    variants = json.loads(obj.image_variants)
+    return variants if variants['source'] == obj.image.name else None
+
+
+def refresh_variants(obj, force=False):
+    """Create the variants of an object's image if they are missing or stale.
+
+    The field is written with a queryset update, so no save signals run;
+    the references to the old and new copies are counted here instead.
+    Returns True if the variants were (re)created or removed.
+    """
+    if not force and (load_variants(obj) is not None or (not obj.image and not obj.image_variants)):
+        return False
+    old_names = variant_names(obj.image_variants)
+    obj.image_variants = json.dumps(make_variants(obj.image)) if obj.image else ''
+    type(obj).objects.filter(pk=obj.pk).update(image_variants=obj.image_variants)
+    change_references(added=variant_names(obj.image_variants), removed=old_names)
+    return True
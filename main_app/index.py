@@ -0,0 +1,247 @@
+from collections import defaultdict
+
+from .models import Disease, DiseaseSymptom
+from .versioning import CATALOG, ProcessCache
+
+
+CHUNK_BITS = 1024
+
+# Weight of a symptom by its DiseaseSymptom.symptom_frequency, as scored by
+# the search ranker. "not chosen" still means the symptom belongs to the
+# disease, so it counts as much as "very rarely".
+FREQUENCY_WEIGHTS = {0: 1, 1: 1, 2: 2, 3: 3, 4: 4, 5: 5}
+
+
+def frequency_weight(frequency):
+    return FREQUENCY_WEIGHTS.get(frequency, 1)
+
+
+class Bitset:
+    """Compact set of non-negative integers.
+
+    Ids are split into chunks of ``CHUNK_BITS`` bits and every non-empty chunk
+    is stored as a Python int, so a sparse set costs memory per used chunk
+    while a dense set costs one bit per id. AND/OR/difference work chunk by
+    chunk.
+    """
+
+    __slots__ = ('chunks',)
+
+    def __init__(self, ids=()):
+        self.chunks = {}
+        for pk in ids:
+            self.add(pk)
+
+    def add(self, pk):
+        key, bit = divmod(pk, CHUNK_BITS)
+        self.chunks[key] = self.chunks.get(key, 0) | (1 << bit)
+
+    def discard(self, pk):
+        key, bit = divmod(pk, CHUNK_BITS)
+        bits = self.chunks.get(key, 0) & ~(1 << bit)
+        if bits:
+            self.chunks[key] = bits
+        else:
+            self.chunks.pop(key, None)
+
+    def copy(self):
+        bitset = Bitset()
+        bitset.chunks = dict(self.chunks)
+        return bitset
+
+    def __and__(self, other):
+        small, large = sorted((self.chunks, other.chunks), key=len)
+        result = Bitset()
+        for key, bits in small.items():
+            bits &= large.get(key, 0)
+            if bits:
+                result.chunks[key] = bits
+        return result
+
+    def __or__(self, other):
+        result = self.copy()
+        for key, bits in other.chunks.items():
+            result.chunks[key] = result.chunks.get(key, 0) | bits
+        return result
+
+    def __sub__(self, other):
+        result = Bitset()
+        for key, bits in self.chunks.items():
+            bits &= ~other.chunks.get(key, 0)
+            if bits:
+                result.chunks[key] = bits
+        return result
+
+    def __contains__(self, pk):
+        key, bit = divmod(pk, CHUNK_BITS)
+        return bool(self.chunks.get(key, 0) >> bit & 1)
+
+    def __iter__(self):
+        for key in sorted(self.chunks):
+            bits = self.chunks[key]
+            base = key * CHUNK_BITS
+            while bits:
+                low = bits & -bits
+                yield base + low.bit_length() - 1
+                bits ^= low
+
+    def __len__(self):
+        return sum(bin(bits).count('1') for bits in self.chunks.values())
+
+    def __bool__(self):
+        return bool(self.chunks)
+
+
+class CatalogIndex:
+    """Inverted index from organ, area and symptom ids to disease bitsets.
+
+    Besides the bitsets the index keeps the forward rows of every disease
+    (symptom frequencies, organs, areas), which lets it drop a disease from
+    the right bitsets and lets the search ranker score candidates, and the
+    total weight of every disease's symptoms, kept up to date with its rows.
+    """
+
+    def __init__(self):
+        self.diseases = Bitset()
+        self.names = {}
+        self.symptoms = defaultdict(Bitset)
+        self.organs = defaultdict(Bitset)
+        self.areas = defaultdict(Bitset)
+        self.disease_symptoms = defaultdict(dict)
+        self.total_weights = defaultdict(int)
+        self.disease_organs = defaultdict(set)
+        self.disease_areas = defaultdict(set)
+
+    @classmethod
+    def from_db(cls):
+        """Build the index with one query per table, no joins."""
+        index = cls()
+        for pk, name in Disease.objects.values_list('pk', 'name').iterator():
+            index.set_name(pk, name)
+
+        rows = DiseaseSymptom.objects.values_list('disease_id', 'symptom_id', 'symptom_frequency')
+        for disease_id, symptom_id, frequency in rows.iterator():
+            index.add_symptom(disease_id, symptom_id, frequency)
+
+        organs = Disease.affected_organs.through.objects.values_list('disease_id', 'organ_id')
+        for disease_id, organ_id in organs.iterator():
+            index.add_organ(disease_id, organ_id)
+
+        areas = Disease.geographical_area.through.objects.values_list('disease_id', 'geographicalarea_id')
+        for disease_id, area_id in areas.iterator():
+            index.add_area(disease_id, area_id)
+        return index
+
+    def set_name(self, disease_id, name):
+        self.diseases.add(disease_id)
+        self.names[disease_id] = name
+
+    def add_symptom(self, disease_id, symptom_id, frequency):
+        self.symptoms[symptom_id].add(disease_id)
+        self.disease_symptoms[disease_id][symptom_id] = frequency
+        self.total_weights[disease_id] += frequency_weight(frequency)
+
+    def add_organ(self, disease_id, organ_id):
+        self.organs[organ_id].add(disease_id)
+        self.disease_organs[disease_id].add(organ_id)
+
+    def remove_organ(self, disease_id, organ_id):
+        self.organs[organ_id].discard(disease_id)
+        self.disease_organs[disease_id].discard(organ_id)
+
+    def add_area(self, disease_id, area_id):
+        self.areas[area_id].add(disease_id)
+        self.disease_areas[disease_id].add(area_id)
+
+    def remove_area(self, disease_id, area_id):
+        self.areas[area_id].discard(disease_id)
+        self.disease_areas[disease_id].discard(area_id)
+
+    def clear_symptoms(self, disease_id):
+        self.total_weights.pop(disease_id, None)
+        for symptom_id in self.disease_symptoms.pop(disease_id, {}):
+            self.symptoms[symptom_id].discard(disease_id)
+
+    def clear_organs(self, disease_id):
+        for organ_id in self.disease_organs.pop(disease_id, set()):
+            self.organs[organ_id].discard(disease_id)
+
+    def clear_areas(self, disease_id):
+        for area_id in self.disease_areas.pop(disease_id, set()):
+            self.areas[area_id].discard(disease_id)
+
+    def remove_disease(self, disease_id):
+        self.diseases.discard(disease_id)
+        self.names.pop(disease_id, None)
+        self.clear_symptoms(disease_id)
+        self.clear_organs(disease_id)
+        self.clear_areas(disease_id)
+
+    def load_disease(self, disease_id, name, symptoms, organs=None, areas=None):
+        """Replace the rows of one disease; None leaves a category unchanged."""
+        self.set_name(disease_id, name)
+        self.clear_symptoms(disease_id)
+        for symptom_id, frequency in symptoms.items():
+            self.add_symptom(disease_id, symptom_id, frequency)
+        if organs is not None:
+            self.clear_organs(disease_id)
+            for organ_id in organs:
+                self.add_organ(disease_id, organ_id)
+        if areas is not None:
+            self.clear_areas(disease_id)
+            for area_id in areas:
+                self.add_area(disease_id, area_id)
+
+    def refresh_symptoms(self, disease_id):
+        """Reload the symptom rows of one disease from the database."""
+        self.clear_symptoms(disease_id)
+        rows = DiseaseSymptom.objects.filter(disease_id=disease_id).values_list('symptom_id', 'symptom_frequency')
+        for symptom_id, frequency in rows:
+            self.add_symptom(disease_id, symptom_id, frequency)
+
+    def _union(self, bitsets, ids):
+        result = Bitset()
+        for pk in ids:
+            if pk in bitsets:
+                result = result | bitsets[pk]
+        return result
+
+    def filter(self, symptoms=(), organs=(), areas=()):
+        """Return the bitset of diseases matching the filters.
+
+        Ids within one category are OR-ed, the categories are AND-ed and an
+        empty category does not filter at all.
+        """
+        result = self.diseases
+        for bitsets, ids in ((self.organs, organs), (self.areas, areas), (self.symptoms, symptoms)):
+            ids = {int(pk) for pk in ids}
+            if ids:
+                result = result & self._union(bitsets, ids)
+        return result
+
+
+# The index remembers the version of the data it was built from; a change
+# made by another process bumps the version and makes the next get_index
+# rebuild it, a change made by this process is applied incrementally with
+# update_index and then recorded with advance_index.
+_indexes = ProcessCache(lambda key: (CATALOG,), lambda key: CatalogIndex.from_db())
+
+
+def get_index():
+    """Return the process-wide index, (re)building it when it is stale."""
+    return _indexes.get()
+
+
+def reset_index():
+    """Drop the index so the next use rebuilds it from the database."""
+    _indexes.clear()
+
+
+def update_index(func, *args):
+    """Apply an incremental change if the index has been built already."""
+    _indexes.update(func, *args)
+
+
+def advance_index(version):
+    """Record that the index holds the change which produced ``version``."""
+    _indexes.advance(version)
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Store an email for the worker instead of sending it in the request."""
+    return OutgoingEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients='\n'.join(recipient_list)
+    )
+
+
+def queue_mail_admins(subject, message):
+    """Queue an email to settings.ADMINS, like django.core.mail.mail_admins."""
+    if not settings.ADMINS:
+        return None
+    return queue_mail(
+        f'{settings.EMAIL_SUBJECT_PREFIX}{subject}',
+        message,
+        settings.SERVER_EMAIL,
+        [address for name, address in settings.ADMINS]
+    )
+
+
+def retry_delay(attempts):
+    """Return the wait before the next attempt, doubling with every failure."""
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+def send_queued_mail(batch_size=50):
+    """Send one batch of due emails over a single connection.
+
+    Rows are locked while the batch is sent (skipping rows locked by other
+    workers where the database supports it). A failed email is retried
+    with exponential backoff and marked failed after MAX_ATTEMPTS.
+    Returns the number of emails sent.
+    """
+    sent = 0
+    with transaction.atomic():
+        emails = OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING, next_attempt_at__lte=timezone.now())
+        if connection.features.has_select_for_update_skip_locked:
+            emails = emails.select_for_update(skip_locked=True)
+        emails = list(emails[:batch_size])
+        if not emails:
+            return 0
+
+        mail_connection = get_connection()
+        try:
+            mail_connection.open()
+        except Exception as error:
+            for email in emails:
+                _failed(email, error)
+            return 0
+        try:
+            for email in emails:
+                message = EmailMessage(
+                    email.subject, email.body, email.from_email, email.recipient_list, connection=mail_connection
+                )
+                try:
+                    message.send()
+                except Exception as error:
+                    _failed(email, error)
+                else:
+                    email.status = OutgoingEmail.SENT
+                    email.attempts += 1
+                    email.sent_at = timezone.now()
+                    email.save(update_fields=['status', 'attempts', 'sent_at'])
+                    sent += 1
+        finally:
+            mail_connection.close()
+    return sent
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutgoingEmail.FAILED
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.generator import CatalogGenerator, Rollback
+from main_app.index import CatalogIndex
+from main_app.models import Disease
+from main_app.search import DiseaseRanker
+
+
+class Command(BaseCommand):
+    help = 'Compare the bitset catalog index and the ranker with the ORM join path on synthetic catalogs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 1000000])
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    self.benchmark(size, options['queries'], random.Random(options['seed']))
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def benchmark(self, size, queries, rnd):
+        self.stdout.write(f'Seeding {size} diseases...')
+        generated = CatalogGenerator(seed=rnd.randint(0, 2 ** 32)).generate(diseases=size, symptoms=2000, organs=50)
+        organs, areas, symptoms = generated['organs'], generated['areas'], generated['symptoms']
+        searches = [
+            (rnd.sample(symptoms, 3), rnd.sample(organs, 2), rnd.sample(areas, 2))
+            for i in range(queries)
+        ]
+
+        start = time.perf_counter()
+        for symptom_ids, organ_ids, area_ids in searches:
+            diseases = Disease.objects.filter(affected_organs__in=organ_ids).distinct()
+            diseases = diseases.filter(symptoms__in=symptom_ids).distinct()
+            diseases = diseases.filter(geographical_area__in=area_ids).distinct()
+            list(diseases.values_list('pk', flat=True))
+        orm = (time.perf_counter() - start) / queries
+
+        start = time.perf_counter()
+        index = CatalogIndex.from_db()
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for symptom_ids, organ_ids, area_ids in searches:
+            list(index.filter(symptom_ids, organ_ids, area_ids))
+        bitset = (time.perf_counter() - start) / queries
+
+        ranker = DiseaseRanker(index)
+        start = time.perf_counter()
+        for symptom_ids, organ_ids, area_ids in searches:
+            ranker.rank(symptom_ids, organ_ids, area_ids)
+        ranked = (time.perf_counter() - start) / queries
+
+        self.stdout.write(
+            f'{size:>9} diseases: ORM {orm * 1000:.2f} ms/query, '
+            f'index {bitset * 1000:.3f} ms/query, ranked {ranked * 1000:.3f} ms/query '
+            f'(built in {build:.1f} s)'
+        )
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from main_app.blobs import collect_garbage, recount_references
+
+
+class Command(BaseCommand):
+    help = 'Delete stored media files which no organ or geographical area refers to.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=1,
+                            help='Keep unreferenced files younger than this, they may belong to running uploads.')
+        parser.add_argument('--recount', action='store_true', help='Recompute reference counts from the database first.')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            recount_references()
+        deleted = collect_garbage(timedelta(hours=options['grace_hours']), dry_run=options['dry_run'])
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(deleted)} files.'))
@@ -0,0 +1,128 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from main_app.generator import CatalogGenerator, Rollback
+from main_app.models import Disease, DiseaseCard, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment
+from main_app.views import (
+    DiseasesListView, GeographicalAreaListView, OrgansListView, SymptomsListView, TreatmentsListView
+)
+
+
+LIST_VIEWS = [
+    ('diseases_list', DiseasesListView),
+    ('geographical_areas_list', GeographicalAreaListView),
+    ('organs_list', OrgansListView),
+    ('symptoms_list', SymptomsListView),
+    ('treatments_list', TreatmentsListView),
+]
+
+
+def keyset_page(view_class, after=None):
+    """The page query a keyset-paginated list view runs for a GET after the cursor ``after``."""
+    view = view_class()
+    view.setup(RequestFactory().get('/'))
+    queryset = view.get_queryset()
+    return view.get_page_queryset(queryset, view.get_paginate_by(queryset), after)
+
+
+def hot_queries():
+    """Return (name, queryset, allowed problems) for the lookups of main_app/views.py.
+
+    The relations of one disease are few rows found by index and sorted by
+    name, so their sorts are allowed.
+    """
+    disease = Disease.objects.order_by('pk')[Disease.objects.count() // 2]
+    names = list(Symptom.objects.order_by('-pk').values_list('name', flat=True)[:8])
+    queries = [
+        ('add_disease: symptoms by name', Symptom.objects.filter(name__in=names), set()),
+        ('disease_details: card by id', DiseaseCard.objects.filter(disease_id__in=[disease.pk]), set()),
+        ('disease_details: symptoms by frequency', DiseaseSymptom.objects.filter(
+            disease_id__in=[disease.pk]
+        ).select_related('symptom').order_by('-symptom_frequency'), set()),
+        ('disease_details: organs', Organ.objects.filter(disease__in=[disease.pk]), {'sort'}),
+        ('disease_details: areas', GeographicalArea.objects.filter(disease__in=[disease.pk]), {'sort'}),
+        ('disease_details: treatments', Treatment.objects.filter(disease__in=[disease.pk]), {'sort'}),
+        ('search_disease: diseases by id', Disease.objects.filter(
+            pk__in=[disease.pk, disease.pk + 1]
+        ).order_by(), set()),
+    ]
+    for name, view_class in LIST_VIEWS:
+        model = view_class.model
+        field = model._meta.ordering[0]
+        middle = list(model.objects.order_by(field, 'pk').values_list(field, 'pk')[model.objects.count() // 2])
+        queries.append((f'{name}: first page', keyset_page(view_class), set()))
+        queries.append((f'{name}: later page', keyset_page(view_class, middle), set()))
+    return queries
+
+
+def plan_problems(plan, vendor):
+    """Return the sequential scans and sorts in a query plan."""
+    problems = []
+    for line in plan.splitlines():
+        if vendor == 'postgresql':
+            scan = re.search(r'Seq Scan on (\w+)', line)
+            if scan:
+                problems.append(f'sequential scan of {scan.group(1)}')
+            elif re.match(r'\s*(->\s*)?(Incremental )?Sort\b', line):
+                problems.append('sort')
+        elif vendor == 'sqlite':
+            scan = re.search(r'\bSCAN (?:TABLE )?(\w+)', line)
+            if scan and 'USING' not in line:
+                problems.append(f'sequential scan of {scan.group(1)}')
+            elif 'USE TEMP B-TREE' in line:
+                problems.append('sort')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on the hot queries of the views and report sequential scans and sorts. '
+        'A synthetic catalog is added for the run and rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--diseases', type=int, default=20000)
+        parser.add_argument('--symptoms', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--no-seed', action='store_true', help='Explain on the data already in the database.')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any query has problems.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Query plans of {connection.vendor} are not supported.')
+        try:
+            with transaction.atomic():
+                if not options['no_seed']:
+                    self.stdout.write(f"Seeding {options['diseases']} diseases...")
+                    CatalogGenerator(seed=options['seed']).generate(
+                        diseases=options['diseases'], symptoms=options['symptoms'],
+                        organs=100, areas=100, treatments=1000
+                    )
+                    with connection.cursor() as cursor:
+                        cursor.execute('ANALYZE')
+                failures = self.audit(options['verbosity'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures and options['fail']:
+            raise CommandError(f'{failures} queries scan or sort tables.')
+
+    def audit(self, verbosity):
+        if not Disease.objects.exists():
+            raise CommandError('There are no diseases to explain the queries on.')
+        failures = 0
+        for name, queryset, allowed in hot_queries():
+            plan = queryset.explain()
+            problems = [problem for problem in plan_problems(plan, connection.vendor) if problem not in allowed]
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.WARNING(f'{name}: {", ".join(sorted(set(problems)))}'))
+            else:
+                self.stdout.write(f'{name}: ok')
+            if verbosity > 1 or problems and verbosity > 0:
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+        return failures
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main_app.generator import CatalogGenerator, clear_catalog
+
+
+class Command(BaseCommand):
+    help = 'Fill the catalog with a deterministic synthetic data set for load and scale testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--diseases', type=int, default=1000)
+        parser.add_argument('--symptoms', type=int, default=500)
+        parser.add_argument('--organs', type=int, default=40)
+        parser.add_argument('--areas', type=int, default=20)
+        parser.add_argument('--treatments', type=int, default=200)
+        parser.add_argument('--symptoms-per-disease', type=int, default=8,
+                            help='Most common number of symptoms of a disease.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help='Delete the existing catalog first.')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['clear']:
+            clear_catalog()
+            self.stdout.write('Deleted the existing catalog.')
+
+        generator = CatalogGenerator(options['seed'], options['batch_size'], self.stdout)
+        generator.generate(
+            diseases=options['diseases'],
+            symptoms=options['symptoms'],
+            organs=options['organs'],
+            areas=options['areas'],
+            treatments=options['treatments'],
+            symptoms_per_disease=options['symptoms_per_disease'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - start:.1f} s.'))
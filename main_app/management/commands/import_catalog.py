@@ -0,0 +1,186 @@
+import csv
+import itertools
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.models import DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment
+from main_app.writers import create_diseases
+
+
+# Related models as (entry key, model, name field).
+RELATIONS = [
+    ('symptoms', Symptom, 'name'),
+    ('affected_organs', Organ, 'name'),
+    ('geographical_area', GeographicalArea, 'area'),
+    ('treatment', Treatment, 'treatment'),
+]
+FREQUENCIES = {value for value, label in DiseaseSymptom.SYMPTOM_FREQUENCY_CHOICES}
+
+
+class InvalidRecord:
+    """Yielded by a reader in place of a record it cannot parse."""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def read_jsonl(stream):
+    """Yield one disease dict per non-empty line.
+
+    ``symptoms`` is a list of ``{"name": ..., "frequency": ...}`` objects or
+    ``[name, frequency]`` pairs; the other relations are lists of names.
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            record['symptoms'] = [
+                (item['name'], item.get('frequency', 0)) if isinstance(item, dict) else tuple(item)
+                for item in record.get('symptoms', ())
+            ]
+        except ValueError as error:
+            yield InvalidRecord(f'invalid JSON ({error})')
+        except (AttributeError, KeyError, TypeError):
+            yield InvalidRecord('invalid symptoms')
+        else:
+            yield record
+
+
+def read_csv(stream):
+    """Yield one disease dict per CSV row.
+
+    Relations are ``;``-separated names, symptoms are ``name:frequency``.
+    """
+    for row in csv.DictReader(stream):
+        record = {'name': row.get('name'), 'description': row.get('description') or ''}
+        for key in ('affected_organs', 'geographical_area', 'treatment'):
+            record[key] = [name.strip() for name in (row.get(key) or '').split(';') if name.strip()]
+        record['symptoms'] = []
+        for item in (row.get('symptoms') or '').split(';'):
+            if item.strip():
+                name, _, frequency = item.rpartition(':') if ':' in item else (item, '', '0')
+                record['symptoms'].append((name.strip(), frequency.strip() or 0))
+        yield record
+
+
+def parse_frequency(value):
+    """Return a valid DiseaseSymptom.symptom_frequency, None if ``value`` is not one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        frequency = int(value)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(value, float) and frequency != value:
+        return None
+    return frequency if frequency in FREQUENCIES else None
+
+
+READERS = {'.jsonl': read_jsonl, '.ndjson': read_jsonl, '.csv': read_csv}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream diseases with their symptoms, organs, areas and treatments from a JSONL or CSV file '
+        'into the catalog in batches. Progress is checkpointed after every batch; '
+        'run again with --resume to continue an interrupted import.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true', help='Skip the records of the last run.')
+        parser.add_argument('--create-missing', action='store_true',
+                            help='Create unknown symptoms, organs, areas and treatments.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        extension = f".{options['format']}" if options['format'] else os.path.splitext(path)[1].lower()
+        if extension not in READERS:
+            raise CommandError(f'Unknown file format {extension!r}, use --format.')
+        self.checkpoint_path = f'{path}.checkpoint'
+        self.create_missing = options['create_missing']
+        self.lookups = {
+            key: dict(model.objects.values_list(field, 'pk'))
+            for key, model, field in RELATIONS
+        }
+
+        done = self.read_checkpoint() if options['resume'] else 0
+        batch, number = [], done
+        with open(path, newline='', encoding='utf-8') as stream:
+            records = itertools.islice(enumerate(READERS[extension](stream), 1), done, None)
+            for number, record in records:
+                entry = self.resolve(number, record)
+                if entry is not None:
+                    batch.append(entry)
+                if number - done >= options['batch_size']:
+                    done = self.flush(batch, number)
+                    batch = []
+            if number > done:
+                done = self.flush(batch, number)
+
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f'Imported {done} records from {path}.'))
+
+    def read_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as checkpoint:
+            return int(checkpoint.read().strip() or 0)
+
+    def write_checkpoint(self, number):
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            checkpoint.write(str(number))
+        os.replace(temporary, self.checkpoint_path)
+
+    def flush(self, batch, number):
+        """Write one batch and remember the last record it covers."""
+        if batch:
+            create_diseases(batch)
+        self.write_checkpoint(number)
+        self.stdout.write(f'Processed {number} records.')
+        return number
+
+    def lookup(self, key, name):
+        """Return the primary key of a related object by its name."""
+        pks = self.lookups[key]
+        if name not in pks and self.create_missing:
+            model, field = next((model, field) for k, model, field in RELATIONS if k == key)
+            pks[name] = model.objects.create(**{field: name}).pk
+        return pks.get(name)
+
+    def skip(self, number, reason):
+        self.stderr.write(f'Record {number}: {reason}, skipped.')
+
+    def resolve(self, number, record):
+        """Return a create_diseases entry for the record, None if invalid."""
+        if isinstance(record, InvalidRecord):
+            return self.skip(number, record.reason)
+        if not isinstance(record, dict) or not record.get('name'):
+            return self.skip(number, 'missing name')
+        symptoms = record['symptoms']
+        if any(len(item) != 2 for item in symptoms):
+            return self.skip(number, 'invalid symptoms')
+        frequencies = [parse_frequency(frequency) for name, frequency in symptoms]
+        if None in frequencies:
+            invalid = [str(item[1]) for item, frequency in zip(symptoms, frequencies) if frequency is None]
+            return self.skip(number, f'invalid symptom frequency {", ".join(invalid)}')
+
+        entry = {'name': str(record['name']), 'description': str(record.get('description') or '')}
+        for key, model, field in RELATIONS:
+            names = [item[0] for item in symptoms] if key == 'symptoms' else record.get(key) or []
+            if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                return self.skip(number, f'invalid {key}')
+            pks = [self.lookup(key, name) for name in names]
+            if None in pks:
+                unknown = [name for name, pk in zip(names, pks) if pk is None]
+                return self.skip(number, f'unknown {key} {", ".join(unknown)}')
+            entry[key] = pks
+        entry['symptoms'] = list(zip(entry['symptoms'], frequencies))
+        return entry
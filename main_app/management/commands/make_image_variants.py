@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from main_app.images import refresh_variants
+from main_app.models import GeographicalArea, Organ
+
+
+class Command(BaseCommand):
+    help = 'Create the pre-sized and WebP copies of existing organ and geographical area images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Recreate copies which are up to date.')
+
+    def handle(self, *args, **options):
+        for model in (Organ, GeographicalArea):
+            created = 0
+            for obj in model.objects.exclude(image='').iterator():
+                try:
+                    created += refresh_variants(obj, force=options['force'])
+                except OSError as error:
+                    self.stderr.write(f'{model.__name__} {obj.pk} ({obj.image.name}): {error}')
+            self.stdout.write(f'{model._meta.verbose_name_plural.capitalize()}: updated {created} images.')
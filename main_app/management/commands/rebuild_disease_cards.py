@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from main_app.cards import CARD_CHUNK_SIZE, card_chunks, rebuild_cards
+
+
+class Command(BaseCommand):
+    help = 'Build the precomputed cards of all diseases.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CARD_CHUNK_SIZE)
+        parser.add_argument('--stale', action='store_true', help='Only rebuild missing and stale cards.')
+
+    def handle(self, *args, **options):
+        if options['stale']:
+            count = sum(len(chunk) for chunk in card_chunks(options['chunk_size']))
+            self.stdout.write(f'Checked {count} disease cards.')
+        else:
+            count = rebuild_cards(options['chunk_size'])
+            self.stdout.write(f'Rebuilt {count} disease cards.')
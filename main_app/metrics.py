@@ -0,0 +1,300 @@
+"""Request metrics per URL name, exposed in the Prometheus text format.
+
+MetricsMiddleware records for every request the latency (as a histogram),
+the number and time of SQL queries, the time spent rendering templates and
+the size of the response, aggregated in-process by the resolved URL name.
+The hit and miss counters of the ranked search cache (search.py) are
+exported alongside.
+
+Under gunicorn every worker has its own totals. With settings.METRICS_DIR
+set, workers write them to ``<METRICS_DIR>/<pid>.json`` at most once per
+``FLUSH_INTERVAL`` seconds and the metrics view adds up the files of all
+workers; gunicorn.conf.py empties the directory when the server starts.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import Http404, HttpResponse
+from django.template.base import Template
+from django.utils.crypto import constant_time_compare
+
+from .search import search_cache
+
+
+PREFIX = 'medical_app'
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 1
+UNRESOLVED = '<unresolved>'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+COUNTERS = (
+    ('db_queries', 'db_queries_total', 'SQL queries run.'),
+    ('db_seconds', 'db_query_duration_seconds_total', 'Time spent running SQL queries.'),
+    ('template_seconds', 'template_render_seconds_total', 'Time spent rendering templates.'),
+    ('response_bytes', 'response_bytes_total', 'Bytes of response bodies.'),
+)
+SEARCH_CACHE_RESULTS = (('hits', 'hit'), ('shared_hits', 'shared_hit'), ('misses', 'miss'))
+SEARCH_CACHE_FIELDS = ('size', 'max_size', 'hits', 'shared_hits', 'misses', 'evictions')
+
+
+def empty_view_stats():
+    return {
+        'requests': {}, 'buckets': [0] * len(BUCKETS), 'duration_sum': 0.0, 'count': 0,
+        'db_queries': 0, 'db_seconds': 0.0, 'template_seconds': 0.0, 'response_bytes': 0,
+    }
+
+
+def empty_totals():
+    return {'views': {}, 'search_cache': dict.fromkeys(SEARCH_CACHE_FIELDS, 0)}
+
+
+def merge(totals, snapshot):
+    """Add the snapshot of one worker to ``totals``."""
+    for view, values in snapshot['views'].items():
+        total = totals['views'].setdefault(view, empty_view_stats())
+        for key, count in values['requests'].items():
+            total['requests'][key] = total['requests'].get(key, 0) + count
+        total['buckets'] = [left + right for left, right in zip(total['buckets'], values['buckets'])]
+        for field in ('duration_sum', 'count', 'db_queries', 'db_seconds', 'template_seconds', 'response_bytes'):
+            total[field] += values[field]
+    for field in SEARCH_CACHE_FIELDS:
+        totals['search_cache'][field] += snapshot['search_cache'].get(field, 0)
+    return totals
+
+
+class Registry:
+    """In-process totals of the recorded requests by URL name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(empty_view_stats)
+        self.flushed_at = 0
+
+    def record(self, view, method, status, duration, db_queries, db_seconds, template_seconds, response_bytes):
+        with self.lock:
+            stats = self.views[view]
+            key = f'{method} {status}'
+            stats['requests'][key] = stats['requests'].get(key, 0) + 1
+            for position, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    stats['buckets'][position] += 1
+                    break
+            stats['duration_sum'] += duration
+            stats['count'] += 1
+            stats['db_queries'] += db_queries
+            stats['db_seconds'] += db_seconds
+            stats['template_seconds'] += template_seconds
+            stats['response_bytes'] += response_bytes
+        if metrics_dir() and time.monotonic() - self.flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        """Return this process's totals by view and its search cache counters."""
+        with self.lock:
+            views = json.loads(json.dumps(self.views))
+        return {'views': views, 'search_cache': search_cache.stats()}
+
+    def flush(self):
+        """Write this process's totals to the metrics directory."""
+        directory = metrics_dir()
+        self.flushed_at = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        with open(f'{path}.tmp', 'w') as snapshot_file:
+            json.dump(self.snapshot(), snapshot_file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Return the totals of all workers, or of this process alone."""
+        directory = metrics_dir()
+        if not directory:
+            return self.snapshot()
+        self.flush()
+        totals = empty_totals()
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(directory, name)) as snapshot_file:
+                        merge(totals, json.load(snapshot_file))
+                except (OSError, ValueError, KeyError):
+                    continue
+        return totals
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+registry = Registry()
+_local = threading.local()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+class RequestStats:
+    """What one request spent on SQL and templates."""
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.rendering = False
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_queries += 1
+            self.db_seconds += time.perf_counter() - start
+
+
+_original_render = Template.render
+
+
+def _timed_render(self, context):
+    # Only the outermost render is timed: included and extended templates
+    # are rendered within it.
+    stats = getattr(_local, 'stats', None)
+    if stats is None or stats.rendering:
+        return _original_render(self, context)
+    stats.rendering = True
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        stats.template_seconds += time.perf_counter() - start
+        stats.rendering = False
+
+
+def install_template_timer():
+    Template.render = _timed_render
+
+
+def view_name(request, default=UNRESOLVED):
+    """Return the URL name of the request's view, ``default`` for unnamed routes and 404s."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None and match.url_name else default
+
+
+class MetricsMiddleware:
+    """Record latency, SQL, template and size metrics of every request.
+
+    Place it first in MIDDLEWARE, so the time includes the other middleware.
+    Streaming responses without a Content-Length are recorded once their
+    content has been sent; queries run while streaming are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        stats = _local.stats = RequestStats()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats.execute_wrapper):
+                response = self.get_response(request)
+        finally:
+            _local.stats = None
+
+        if not response.streaming:
+            self.record(request, response, stats, start, len(response.content))
+        elif response.has_header('Content-Length'):
+            self.record(request, response, stats, start, int(response['Content-Length']))
+        else:
+            content = response.streaming_content
+            response.streaming_content = self.count_streamed(content, request, response, stats, start)
+        return response
+
+    def count_streamed(self, content, request, response, stats, start):
+        sent = 0
+        try:
+            for chunk in content:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, response, stats, start, sent)
+
+    def record(self, request, response, stats, start, response_bytes):
+        registry.record(
+            view_name(request), request.method, response.status_code, time.perf_counter() - start,
+            stats.db_queries, stats.db_seconds, stats.template_seconds, response_bytes,
+        )
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def render_metrics(totals):
+    """Return the totals in the Prometheus text exposition format."""
+    lines = []
+
+    def family(name, metric_type, help_text):
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {metric_type}')
+
+    views = sorted(totals['views'].items())
+    family('requests_total', 'counter', 'Requests by URL name, method and status.')
+    for view, stats in views:
+        for key, count in sorted(stats['requests'].items()):
+            method, status = key.split(' ')
+            lines.append(
+                f'{PREFIX}_requests_total{{view="{escape_label(view)}",method="{method}",status="{status}"}} {count}'
+            )
+
+    family('request_duration_seconds', 'histogram', 'Request latency by URL name.')
+    for view, stats in views:
+        label = f'view="{escape_label(view)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stats['buckets']):
+            cumulative += count
+            lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+        lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats["count"]}')
+        lines.append(f'{PREFIX}_request_duration_seconds_sum{{{label}}} {stats["duration_sum"]}')
+        lines.append(f'{PREFIX}_request_duration_seconds_count{{{label}}} {stats["count"]}')
+
+    for field, name, help_text in COUNTERS:
+        family(name, 'counter', help_text)
+        for view, stats in views:
+            lines.append(f'{PREFIX}_{name}{{view="{escape_label(view)}"}} {stats[field]}')
+
+    cache = totals['search_cache']
+    family('search_cache_lookups_total', 'counter', 'Ranked search lookups by result: hit, shared_hit or miss.')
+    for field, result in SEARCH_CACHE_RESULTS:
+        lines.append(f'{PREFIX}_search_cache_lookups_total{{result="{result}"}} {cache[field]}')
+    family('search_cache_evictions_total', 'counter', 'Ranked searches evicted from the cache.')
+    lines.append(f'{PREFIX}_search_cache_evictions_total {cache["evictions"]}')
+    family('search_cache_entries', 'gauge', 'Ranked searches held in the cache of all workers.')
+    lines.append(f'{PREFIX}_search_cache_entries {cache["size"]}')
+    family('search_cache_max_entries', 'gauge', 'Capacity of the cache of all workers (SEARCH_CACHE_SIZE each).')
+    lines.append(f'{PREFIX}_search_cache_max_entries {cache["max_size"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_allowed(request):
+    """Staff users, clients with settings.METRICS_TOKEN or allowed addresses."""
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return constant_time_compare(header, f'Bearer {token}')
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+
+
+def metrics_view(request):
+    """Serve the metrics of all workers in the Prometheus text format."""
+    if not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(render_metrics(registry.collect()), content_type=CONTENT_TYPE)
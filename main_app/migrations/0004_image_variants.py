@@ -0,0 +1,23 @@
+# Generated by Django 2.2.17 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='geographicalarea',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='organ',
+            name='image_variants',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge symptoms with the same name and repeated disease/symptom rows.
+
+    The rows of a duplicate symptom move to the symptom with the lowest
+    primary key; of several rows for one disease and symptom the one with
+    the highest frequency is kept.
+    """
+    Symptom = apps.get_model('main_app', 'Symptom')
+    DiseaseSymptom = apps.get_model('main_app', 'DiseaseSymptom')
+
+    kept = {}
+    for pk, name in Symptom.objects.order_by('pk').values_list('pk', 'name'):
+        if name in kept:
+            DiseaseSymptom.objects.filter(symptom_id=pk).update(symptom_id=kept[name])
+            Symptom.objects.filter(pk=pk).delete()
+        else:
+            kept[name] = pk
+
+    seen = set()
+    rows = DiseaseSymptom.objects.order_by('disease_id', 'symptom_id', '-symptom_frequency', 'pk')
+    for pk, disease_id, symptom_id in rows.values_list('pk', 'disease_id', 'symptom_id'):
+        if (disease_id, symptom_id) in seen:
+            DiseaseSymptom.objects.filter(pk=pk).delete()
+        else:
+            seen.add((disease_id, symptom_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_storedblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.17 on 2026-10-18 12:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_merge_duplicate_symptoms'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='symptom',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='disease',
+            index=models.Index(fields=['name', 'id'], name='disease_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diseasesymptom',
+            index=models.Index(fields=['disease', '-symptom_frequency'], name='diseasesymptom_frequency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='geographicalarea',
+            index=models.Index(fields=['area', 'id'], name='area_area_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='organ',
+            index=models.Index(fields=['name', 'id'], name='organ_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='symptom',
+            index=models.Index(fields=['name', 'id'], name='symptom_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='treatment',
+            index=models.Index(fields=['treatment', 'id'], name='treatment_treatment_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='diseasesymptom',
+            constraint=models.UniqueConstraint(fields=('disease', 'symptom'), name='diseasesymptom_unique'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 2.2.17 on 2026-10-18 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiseaseCard',
+            fields=[
+                ('disease', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='main_app.Disease')),
+                ('versions', models.CharField(max_length=64)),
+                ('data', models.TextField()),
+            ],
+        ),
+    ]
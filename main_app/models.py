@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.urls import reverse
+from django.utils import timezone
 
 
 class GeographicalArea(models.Model):
@@ -8,12 +9,15 @@ class GeographicalArea(models.Model):
 
     area = models.TextField()
     image = models.ImageField(upload_to='geographical_area/')
+    image_variants = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.area
 
     class Meta:
         ordering = ['area']
+        # Matches the keyset pagination order of the list views.
+        indexes = [models.Index(fields=['area', 'id'], name='area_area_id_idx')]
 
 
 class Organ(models.Model):
@@ -22,18 +26,20 @@ class Organ(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     image = models.ImageField(upload_to='organs/')
+    image_variants = models.TextField(blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name', 'id'], name='organ_name_id_idx')]
 
 
 class Symptom(models.Model):
     """ Symptoms model. """
 
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
     affected_organ = models.ForeignKey(Organ, on_delete=models.CASCADE, null=True)
 
     def __str__(self):
@@ -41,6 +47,7 @@ class Symptom(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name', 'id'], name='symptom_name_id_idx')]
 
 
 class Treatment(models.Model):
@@ -53,6 +60,7 @@ class Treatment(models.Model):
 
     class Meta:
         ordering = ['treatment']
+        indexes = [models.Index(fields=['treatment', 'id'], name='treatment_treatment_id_idx')]
 
 
 class Disease(models.Model):
@@ -74,6 +82,7 @@ class Disease(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [models.Index(fields=['name', 'id'], name='disease_name_id_idx')]
 
 
 class DiseaseSymptom(models.Model):
@@ -100,6 +109,25 @@ class DiseaseSymptom(models.Model):
 
     class Meta:
         ordering = ['disease']
+        indexes = [
+            # Symptoms of a disease by frequency (disease details, API, export).
+            models.Index(fields=['disease', '-symptom_frequency'], name='diseasesymptom_frequency_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['disease', 'symptom'], name='diseasesymptom_unique'),
+        ]
+
+
+class DiseaseCard(models.Model):
+    """ Precomputed JSON snapshot of a disease with its relations (see cards.py). """
+
+    disease = models.OneToOneField(Disease, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    # Versions of the disease the snapshot was built from.
+    versions = models.CharField(max_length=64)
+    data = models.TextField()
+
+    def __str__(self):
+        return f'Card of disease {self.disease_id}'
 
 
 class User(AbstractUser):
@@ -111,3 +139,66 @@ class User(AbstractUser):
     def full_name(self):
         """Return user first name and last name."""
         return f'{self.first_name} {self.last_name}'
+
+
+class OutgoingEmail(models.Model):
+    """ Email waiting in the queue for the send_queued_mail worker. """
+
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'pending'),
+        (SENT, 'sent'),
+        (FAILED, 'failed')
+    )
+
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField(help_text='One address per line.')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.subject} ({self.status})'
+
+    @property
+    def recipient_list(self):
+        return self.recipients.split()
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+
+class StoredBlob(models.Model):
+    """ Deduplicated media file and the number of fields referring to it. """
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveIntegerField()
+    references = models.IntegerField(default=0)
+    # Moved forward whenever the content is stored again (blobs.register_blob).
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+    class Meta:
+        ordering = ['name']
+
+
+class Version(models.Model):
+    """ Version counter of main_app/versioning.py. """
+
+    name = models.CharField(max_length=255, primary_key=True)
+    value = models.BigIntegerField()
+    # time.time() of the last bump.
+    modified = models.FloatField()
+
+    def __str__(self):
+        return f'{self.name} = {self.value}'
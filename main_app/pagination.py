@@ -0,0 +1,131 @@
+import base64
+import binascii
+import json
+import math
+
+from django.db.models import Q, QuerySet
+from django.http import Http404
+
+
+# Range of 64-bit integer columns such as primary keys.
+BIGINT_MIN, BIGINT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def is_bigint(value):
+    """Return True for an int which fits a 64-bit integer column."""
+    return type(value) is int and BIGINT_MIN <= value <= BIGINT_MAX
+
+
+def encode_cursor(values):
+    """Return an URL-safe cursor for the ordering values of a row."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ordering values stored in a cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('Invalid cursor')
+    if not isinstance(values, list) or len(values) != 2:
+        raise Http404('Invalid cursor')
+    value, pk = values
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool) or not is_bigint(pk):
+        raise Http404('Invalid cursor')
+    # Out of range numbers overflow the database parameters.
+    if isinstance(value, int) and not is_bigint(value) or isinstance(value, float) and not math.isfinite(value):
+        raise Http404('Invalid cursor')
+    return values
+
+
+class KeysetPage:
+    """One page of a keyset-paginated list with cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin:
+    """Paginate a list view by cursor instead of by page number.
+
+    Rows are ordered by the first field of the model's ``Meta.ordering`` and
+    by primary key. The ``after``/``before`` URL parameters hold the ordering
+    values of the last/first row of the neighbouring page, so every page is a
+    single indexed range query however deep the user goes.
+    """
+
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        # CreateView hybrids never set object_list; build it per request.
+        if getattr(self, 'object_list', None) is None:
+            self.object_list = self.get_queryset()
+        kwargs.setdefault('object_list', self.object_list)
+        return super().get_context_data(**kwargs)
+
+    def get_keyset_field(self):
+        field = self.model._meta.ordering[0]
+        return field.lstrip('-'), field.startswith('-')
+
+    def get_page_queryset(self, queryset, page_size, cursor=None, backwards=False):
+        """Return the query of one page: up to ``page_size + 1`` rows past the cursor.
+
+        Rows are walked in display order when going forwards and reversed
+        when going back.
+        """
+        field, descending = self.get_keyset_field()
+        reverse = descending != backwards
+        ordering = [f'-{field}', '-pk'] if reverse else [field, 'pk']
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            value, pk = cursor
+            lookup = 'lt' if reverse else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value}) | Q(**{field: value, f'pk__{lookup}': pk})
+            )
+        return queryset[:page_size + 1]
+
+    def paginate_queryset(self, queryset, page_size):
+        if not isinstance(queryset, QuerySet):
+            return super().paginate_queryset(queryset, page_size)
+
+        field, descending = self.get_keyset_field()
+        after = self.request.GET.get('after')
+        before = self.request.GET.get('before')
+        backwards = before is not None and after is None
+        cursor = decode_cursor(before if backwards else after) if (after or before) else None
+
+        rows = list(self.get_page_queryset(queryset, page_size, cursor, backwards))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        def cursor_for(obj):
+            return encode_cursor([getattr(obj, field), obj.pk])
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or backwards:
+                next_cursor = cursor_for(rows[-1])
+            if cursor is not None and (has_more or not backwards):
+                previous_cursor = cursor_for(rows[0])
+        page = KeysetPage(rows, next_cursor, previous_cursor)
+        return (None, page, rows, page.has_other_pages())
@@ -0,0 +1,234 @@
+"""Boolean disease queries over symptom, organ and area ids.
+
+A query combines terms with ``AND``, ``OR``, ``NOT`` and parentheses;
+adjacent terms are AND-ed. A term is ``s:<id>`` (symptom), ``o:<id>``
+(organ) or ``a:<id>`` (area); ``s:<id>>=<n>`` only matches diseases with
+that symptom at DiseaseSymptom.symptom_frequency ``n`` or more::
+
+    (s:12>=3 OR s:7) AND o:2 AND NOT a:5
+
+Equivalent queries have the same canonical form (``str(query)``): nested
+AND/OR are flattened, operands are sorted and deduplicated and double
+negations dropped. The empty query matches every disease. Queries longer
+than ``MAX_LENGTH`` characters or nested deeper than ``MAX_DEPTH``
+parentheses and NOTs are rejected.
+"""
+import re
+
+from .index import Bitset
+
+
+KINDS = ('s', 'o', 'a')
+OPERATORS = ('AND', 'OR', 'NOT')
+MAX_LENGTH = 2000
+MAX_DEPTH = 32
+TOKEN_RE = re.compile(r'\s*(?:(\()|(\))|([soa]):(\d+)(?:>=(\d+))?|([A-Za-z]+))', re.IGNORECASE)
+
+
+class QuerySyntaxError(ValueError):
+    pass
+
+
+class Term:
+    """One symptom, organ or area id; ``minimum`` is a symptom frequency."""
+
+    def __init__(self, kind, pk, minimum=None):
+        self.kind, self.pk = kind, pk
+        self.minimum = minimum or None
+
+    def sort_key(self):
+        return (0, KINDS.index(self.kind), self.pk, self.minimum or 0)
+
+    def __str__(self):
+        return f'{self.kind}:{self.pk}' + (f'>={self.minimum}' if self.minimum else '')
+
+    def evaluate(self, index):
+        bitsets = {'s': index.symptoms, 'o': index.organs, 'a': index.areas}[self.kind]
+        diseases = bitsets.get(self.pk, Bitset())
+        if self.minimum:
+            diseases = Bitset(
+                pk for pk in diseases if index.disease_symptoms[pk].get(self.pk, 0) >= self.minimum
+            )
+        return diseases
+
+    def symptoms(self):
+        return {self.pk} if self.kind == 's' else set()
+
+
+class Not:
+
+    def __init__(self, operand):
+        self.operand = operand
+
+    def sort_key(self):
+        return (1, str(self))
+
+    def __str__(self):
+        operand = str(self.operand)
+        return f'NOT ({operand})' if isinstance(self.operand, Group) else f'NOT {operand}'
+
+    def evaluate(self, index):
+        return index.diseases - self.operand.evaluate(index)
+
+    def symptoms(self):
+        # Excluded symptoms do not add to the score.
+        return set()
+
+
+class Group:
+    """AND or OR of two or more operands."""
+
+    def __init__(self, operator, operands):
+        self.operator, self.operands = operator, operands
+
+    def sort_key(self):
+        return (2, str(self))
+
+    def __str__(self):
+        parts = []
+        for operand in self.operands:
+            text = str(operand)
+            parts.append(f'({text})' if isinstance(operand, Group) else text)
+        return f' {self.operator} '.join(parts)
+
+    def evaluate(self, index):
+        results = [operand.evaluate(index) for operand in self.operands]
+        combined = results[0]
+        for result in results[1:]:
+            combined = combined & result if self.operator == 'AND' else combined | result
+        return combined
+
+    def symptoms(self):
+        return set().union(*(operand.symptoms() for operand in self.operands))
+
+
+def combine(operator, operands):
+    """Return the canonical AND/OR of operands, flattened, sorted and deduplicated."""
+    flat = {}
+    for operand in operands:
+        if operand is None:
+            continue
+        children = operand.operands if isinstance(operand, Group) and operand.operator == operator else [operand]
+        for child in children:
+            flat.setdefault(str(child), child)
+    ordered = sorted(flat.values(), key=lambda operand: operand.sort_key())
+    if not ordered:
+        return None
+    return ordered[0] if len(ordered) == 1 else Group(operator, ordered)
+
+
+def negate(operand):
+    return operand.operand if isinstance(operand, Not) else Not(operand)
+
+
+class Parser:
+
+    def __init__(self, text):
+        self.tokens = self.tokenize(text)
+        self.position = 0
+        self.depth = 0
+
+    def tokenize(self, text):
+        tokens, position, text = [], 0, text.strip()
+        if len(text) > MAX_LENGTH:
+            raise QuerySyntaxError(f'The query is longer than {MAX_LENGTH} characters.')
+        while position < len(text):
+            match = TOKEN_RE.match(text, position)
+            if match is None or match.end() == position:
+                raise QuerySyntaxError(f'Unexpected text at position {position}: {text[position:position + 10]!r}')
+            opening, closing, kind, pk, minimum, word = match.groups()
+            if kind:
+                if minimum is not None and kind.lower() != 's':
+                    raise QuerySyntaxError('A frequency threshold applies to symptoms only.')
+                try:
+                    tokens.append(Term(kind.lower(), int(pk), int(minimum) if minimum else None))
+                except ValueError as error:
+                    raise QuerySyntaxError(f'Invalid number at position {position}.') from error
+            elif word:
+                if word.upper() not in OPERATORS:
+                    raise QuerySyntaxError(f'Unknown word {word!r}.')
+                tokens.append(word.upper())
+            else:
+                tokens.append(opening or closing)
+            position = match.end()
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            return None
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError(f'Unexpected {self.peek()}.')
+        return node
+
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            operands.append(self.parse_and())
+        return combine('OR', operands)
+
+    def parse_and(self):
+        operands = [self.parse_not()]
+        while self.peek() not in (None, 'OR', ')'):
+            if self.peek() == 'AND':
+                self.take()
+            operands.append(self.parse_not())
+        return combine('AND', operands)
+
+    def parse_not(self):
+        token = self.take()
+        if token in ('NOT', '('):
+            self.depth += 1
+            if self.depth > MAX_DEPTH:
+                raise QuerySyntaxError(f'The query is nested deeper than {MAX_DEPTH} levels.')
+            if token == 'NOT':
+                node = negate(self.parse_not())
+            else:
+                node = self.parse_or()
+                if self.take() != ')':
+                    raise QuerySyntaxError('Missing ).')
+            self.depth -= 1
+            return node
+        if isinstance(token, Term):
+            return token
+        raise QuerySyntaxError('Expected a term.' if token is None else f'Unexpected {token}.')
+
+
+class Query:
+    """A parsed query; ``str()`` gives its canonical form."""
+
+    def __init__(self, root=None):
+        self.root = root
+
+    @classmethod
+    def parse(cls, text):
+        return cls(Parser(text).parse())
+
+    @classmethod
+    def from_filters(cls, symptoms=(), organs=(), areas=(), min_frequency=None):
+        """Return the query of the search form: any of the ids of each kind, all kinds."""
+        groups = [
+            combine('OR', [Term(kind, pk, min_frequency if kind == 's' else None) for pk in ids])
+            for kind, ids in (('s', symptoms), ('o', organs), ('a', areas))
+        ]
+        return cls(combine('AND', groups))
+
+    def __str__(self):
+        return str(self.root) if self.root is not None else ''
+
+    def evaluate(self, index):
+        """Return the bitset of matching diseases."""
+        return self.root.evaluate(index) if self.root is not None else index.diseases
+
+    def symptoms(self):
+        """Return the symptom ids which count towards a disease's score."""
+        return self.root.symptoms() if self.root is not None else set()
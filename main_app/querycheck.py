@@ -0,0 +1,132 @@
+"""Detector of N+1 and duplicate queries, for development and tests.
+
+With settings.QUERYCHECK on, QueryCheckMiddleware records the SQL of every
+request. Queries are grouped by their shape (the SQL with literals and
+parameters replaced by ``?``) and by the template line or project code
+which ran them. A shape run more than settings.QUERYCHECK_THRESHOLD times
+from one place is an N+1 pattern; the same SQL with the same parameters
+run twice is a duplicate. Offenders are logged as warnings of the
+``main_app.querycheck`` logger, summarized in the ``X-Query-Check``
+response header and sent with the ``queries_checked`` signal, which the
+pytest plugin in main_app/querycheck_pytest.py listens to.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.dispatch import Signal
+
+from .metrics import view_name
+
+
+logger = logging.getLogger(__name__)
+
+queries_checked = Signal(providing_args=['request', 'offenders'])
+
+HEADER = 'X-Query-Check'
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s")
+IN_LIST_RE = re.compile(r'\bIN \((?:\?, )*\?\)')
+LINE_RE = re.compile(r':\d+')
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IGNORED_PATHS = (os.path.abspath(__file__), os.path.dirname(os.path.abspath(__file__)) + os.sep + 'metrics.py')
+
+
+def fingerprint(sql):
+    """Return the shape of a query: literals as ``?`` and IN lists as ``IN (...)``."""
+    return IN_LIST_RE.sub('IN (...)', LITERAL_RE.sub('?', sql))
+
+
+def caller():
+    """Return the project code and template line which are running a query.
+
+    Either part may be missing: ``authorization.py:20 in has_group via
+    base.html:30``, ``views.py:105 in get`` or ``disease_details_body.html:9``.
+    """
+    frame = sys._getframe(2)
+    code_location = template_location = None
+    while frame is not None and template_location is None:
+        node = frame.f_locals.get('self') if frame.f_code.co_name == 'render_annotated' else None
+        if node is not None and getattr(node, 'token', None) is not None and getattr(node, 'origin', None):
+            template_location = f'{node.origin.template_name or node.origin.name}:{node.token.lineno}'
+        path = frame.f_code.co_filename
+        if code_location is None and is_project_code(path):
+            code_location = f'{os.path.relpath(os.path.abspath(path), PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return ' via '.join(location for location in (code_location, template_location) if location) or '<unknown>'
+
+
+def is_project_code(path):
+    path = os.path.abspath(path) if not path.startswith('<') else path
+    return (
+        path.startswith(PROJECT_ROOT + os.sep) and path not in IGNORED_PATHS
+        and 'site-packages' not in path and f'{os.sep}tests{os.sep}' not in path
+    )
+
+
+class Offender:
+    """A query shape run too often from one place during a request."""
+
+    def __init__(self, kind, view, location, shape, count):
+        self.kind, self.view, self.location, self.shape, self.count = kind, view, location, shape, count
+
+    @property
+    def key(self):
+        """Identifies the offender across runs, without counts and line numbers."""
+        return f"{self.kind} {self.view} {LINE_RE.sub('', self.location)} {self.shape}"
+
+    def __str__(self):
+        return f'{self.kind} x{self.count} in {self.view} at {self.location}: {self.shape[:200]}'
+
+
+class QueryRecorder:
+    """Execute wrapper collecting the shape, parameters and origin of queries."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, repr(params), caller()))
+        return execute(sql, params, many, context)
+
+    def offenders(self, view, threshold):
+        shapes = Counter((fingerprint(sql), location) for sql, params, location in self.queries)
+        exact = Counter(self.queries)
+        found = [
+            Offender('repeated', view, location, shape, count)
+            for (shape, location), count in shapes.items() if count > threshold
+        ]
+        repeated = {(offender.shape, offender.location) for offender in found}
+        found.extend(
+            Offender('duplicate', view, location, fingerprint(sql), count)
+            for (sql, params, location), count in exact.items()
+            if count > 1 and (fingerprint(sql), location) not in repeated
+        )
+        return found
+
+
+class QueryCheckMiddleware:
+    """Report repeated and duplicate queries of every request (settings.QUERYCHECK)."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERYCHECK', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERYCHECK_THRESHOLD', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        offenders = recorder.offenders(view_name(request, request.path), self.threshold)
+        for offender in offenders:
+            logger.warning('Query check: %s', offender)
+        kinds = Counter(offender.kind for offender in offenders)
+        response[HEADER] = f"queries={len(recorder.queries)}; repeated={kinds['repeated']}; duplicate={kinds['duplicate']}"
+        queries_checked.send(sender=type(self), request=request, offenders=offenders)
+        return response
@@ -0,0 +1,80 @@
+"""pytest plugin mode of the query detector (main_app/querycheck.py).
+
+Loaded by pytest.ini and idle unless asked for. ``pytest --querycheck``
+turns settings.QUERYCHECK on and fails every test whose requests run a
+repeated or duplicate query missing from the baseline of known offenders,
+main_app/tests/querycheck_baseline.json. ``--querycheck-update`` writes the
+offenders found by the run to the baseline instead, so run it on the whole
+suite.
+"""
+import json
+import os
+
+import pytest
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'tests', 'querycheck_baseline.json')
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('querycheck', 'N+1 and duplicate query detector')
+    group.addoption(
+        '--querycheck', action='store_true',
+        help='fail tests whose requests run repeated or duplicate queries not in the baseline'
+    )
+    group.addoption(
+        '--querycheck-update', action='store_true',
+        help='write the repeated and duplicate queries found to the baseline'
+    )
+
+
+def pytest_configure(config):
+    if config.getoption('querycheck') or config.getoption('querycheck_update'):
+        config.pluginmanager.register(QueryCheckPlugin(config), 'querycheck')
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return set()
+    with open(BASELINE_PATH) as baseline_file:
+        return set(json.load(baseline_file))
+
+
+class QueryCheckPlugin:
+
+    def __init__(self, config):
+        self.update = config.getoption('querycheck_update')
+        self.baseline = load_baseline()
+        self.found = set()
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item):
+        from django.conf import settings
+        from main_app.querycheck import queries_checked
+
+        offenders = []
+
+        def collect(sender, **kwargs):
+            offenders.extend(kwargs['offenders'])
+
+        settings.QUERYCHECK = True
+        queries_checked.connect(collect, weak=False)
+        try:
+            outcome = yield
+        finally:
+            queries_checked.disconnect(collect)
+
+        self.found.update(offender.key for offender in offenders)
+        new = [offender for offender in offenders if offender.key not in self.baseline]
+        if new and not self.update and outcome.excinfo is None:
+            pytest.fail(
+                'Queries repeated in a request (fix them or run with --querycheck-update):\n'
+                + '\n'.join(f'  {offender}' for offender in new),
+                pytrace=False
+            )
+
+    def pytest_sessionfinish(self, session):
+        if self.update:
+            with open(BASELINE_PATH, 'w') as baseline_file:
+                json.dump(sorted(self.found), baseline_file, indent=2)
+                baseline_file.write('\n')
@@ -0,0 +1,151 @@
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .index import frequency_weight, get_index
+from .models import Disease
+from .query import Query
+from .versioning import CATALOG, GENERATION, get_versions
+
+
+class DiseaseRanker:
+    """Ranks diseases by a frequency-weighted match of their symptoms.
+
+    The disease x symptom weight matrix is the forward half of the catalog
+    index, so a search only scores the diseases left after the organ, area
+    and symptom bitsets have been combined.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def rank(self, symptoms=(), organs=(), areas=(), limit=100):
+        """Return up to ``limit`` (disease_id, score) pairs, best match first.
+
+        The score is the sum of the frequency weights of the matched symptoms.
+        Ties are broken by the share of the disease's symptom weight which was
+        matched, then by disease name.
+        """
+        symptoms = {int(pk) for pk in symptoms}
+        return self.order(self.index.filter(symptoms, organs, areas), symptoms, limit)
+
+    def rank_query(self, query, limit=100):
+        """Like ``rank`` for the diseases matching a Query, scored by its symptoms."""
+        return self.order(query.evaluate(self.index), query.symptoms(), limit)
+
+    def order(self, candidates, symptoms, limit):
+        index = self.index
+        if not symptoms:
+            return [(pk, 0) for pk in heapq.nsmallest(limit, candidates, key=index.names.__getitem__)]
+
+        def sort_key(pk):
+            row = index.disease_symptoms.get(pk, {})
+            score = sum(frequency_weight(row[symptom_id]) for symptom_id in symptoms if symptom_id in row)
+            # A disease without symptoms can still match by organ or area.
+            total = index.total_weights.get(pk, 0)
+            share = score / total if total else 0
+            return (-score, -share, index.names[pk])
+
+        best = heapq.nsmallest(limit, ((sort_key(pk), pk) for pk in candidates))
+        return [(pk, -key[0]) for key, pk in best]
+
+
+def normalize_ids(values):
+    """Return the distinct numeric ids among ``values`` as a sorted tuple."""
+    return tuple(sorted({int(value) for value in values if str(value).isdigit()}))
+
+
+class SearchResultCache:
+    """LRU cache of ranked search results.
+
+    Results are stored as tuples of (disease_id, score) pairs under the
+    canonical query and the catalog version, so any catalog change makes
+    the old entries unreachable; they are evicted as the least recently
+    used. With ``backend`` (a cache alias) results are shared with other
+    processes as well. ``stats()`` returns the hit and miss counters, which
+    are served at /metrics (metrics.py).
+    """
+
+    def __init__(self, size=1000, backend=None):
+        self.size = size
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            'size': len(self.entries), 'max_size': self.size, 'hits': self.hits,
+            'shared_hits': self.shared_hits, 'misses': self.misses, 'evictions': self.evictions,
+        }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.reset_stats()
+
+    def shared_key(self, key):
+        return 'search:' + hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get_or_rank(self, key, rank):
+        """Return the cached result for ``key``, calling ``rank()`` on a miss."""
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        shared = caches[self.backend] if self.backend else None
+        result = shared.get(self.shared_key(key)) if shared else None
+        with self.lock:
+            if result is not None:
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+        if result is None:
+            result = tuple(rank())
+            if shared:
+                shared.set(self.shared_key(key), result)
+
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+
+search_cache = SearchResultCache(
+    getattr(settings, 'SEARCH_CACHE_SIZE', 1000),
+    getattr(settings, 'SEARCH_CACHE_BACKEND', None),
+)
+
+
+def query_diseases(query, limit=100):
+    """Return Disease objects matching a Query ordered by relevance."""
+    key = (get_versions(GENERATION, CATALOG), str(query), limit)
+    ranked = search_cache.get_or_rank(key, lambda: DiseaseRanker(get_index()).rank_query(query, limit))
+    diseases = Disease.objects.in_bulk([pk for pk, score in ranked])
+    results = []
+    for pk, score in ranked:
+        if pk in diseases:
+            diseases[pk].score = score
+            results.append(diseases[pk])
+    return results
+
+
+def rank_diseases(symptoms=(), organs=(), areas=(), limit=100, min_frequency=None):
+    """Return Disease objects matching the filters ordered by relevance."""
+    query = Query.from_filters(
+        normalize_ids(symptoms), normalize_ids(organs), normalize_ids(areas), min_frequency
+    )
+    return query_diseases(query, limit)
@@ -0,0 +1,239 @@
+from functools import partial
+
+from django.contrib.auth.models import Group
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .authorization import user_groups_version_name
+from .blobs import change_references, image_names
+from .cards import cards_showing, drop_cards
+from .fulltext import TextIndex, advance_text_index, update_text_index
+from .images import refresh_variants
+from .index import CatalogIndex, advance_index, update_index
+from .models import Disease, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment, User
+from .versioning import (
+    CATALOG, bump_version, bump_versions, disease_version_name, forget_versions,
+    object_version_name, remember_versions, table_version_name
+)
+
+
+# Sent by the bulk write path in writers.py, which bypasses per-row signals.
+disease_written = Signal(providing_args=['disease', 'symptoms', 'organs', 'areas'])
+
+request_started.connect(remember_versions, dispatch_uid='remember_versions')
+request_finished.connect(forget_versions, dispatch_uid='forget_versions')
+
+
+@receiver(post_save, sender=Disease)
+def disease_saved(sender, instance, **kwargs):
+    """Keep the disease name and text in the search indexes up to date."""
+    _on_commit(update_index, CatalogIndex.set_name, instance.pk, instance.name)
+    _on_commit(update_text_index, TextIndex.add, instance.pk, instance.name, instance.description)
+
+
+@receiver(post_delete, sender=Disease)
+def disease_deleted(sender, instance, **kwargs):
+    """Drop the disease from the search indexes."""
+    _on_commit(update_index, CatalogIndex.remove_disease, instance.pk)
+    _on_commit(update_text_index, TextIndex.remove, instance.pk)
+
+
+@receiver(post_save, sender=DiseaseSymptom)
+@receiver(post_delete, sender=DiseaseSymptom)
+def disease_symptom_changed(sender, instance, **kwargs):
+    """Reload the symptom rows of the disease in the search index."""
+    _on_commit(update_index, CatalogIndex.refresh_symptoms, instance.disease_id)
+
+
+@receiver(post_delete, sender=Organ)
+def organ_deleted(sender, instance, **kwargs):
+    """Drop a deleted organ from the search index."""
+    _on_commit(update_index, _remove_all, 'organs', instance.pk, CatalogIndex.remove_organ)
+
+
+@receiver(post_delete, sender=GeographicalArea)
+def area_deleted(sender, instance, **kwargs):
+    """Drop a deleted geographical area from the search index."""
+    _on_commit(update_index, _remove_all, 'areas', instance.pk, CatalogIndex.remove_area)
+
+
+@receiver(pre_save, sender=Organ)
+@receiver(pre_save, sender=GeographicalArea)
+def image_changing(sender, instance, **kwargs):
+    """Remember the image the object referred to before the save."""
+    old = sender.objects.filter(pk=instance.pk).values_list('image', flat=True).first() if instance.pk else None
+    instance._old_image_name = old
+
+
+@receiver(post_save, sender=Organ)
+@receiver(post_save, sender=GeographicalArea)
+def image_saved(sender, instance, **kwargs):
+    """Count references to a new image and create its pre-sized copies."""
+    old = instance.__dict__.pop('_old_image_name', None)
+    change_references(added=[instance.image.name] if instance.image else [], removed=[old] if old else [])
+    try:
+        refresh_variants(instance)
+    except OSError:
+        # Missing or unreadable file: pages fall back to the original image.
+        pass
+
+
+@receiver(post_delete, sender=Organ)
+@receiver(post_delete, sender=GeographicalArea)
+def image_deleted(sender, instance, **kwargs):
+    """Drop the references of a deleted object to its image files."""
+    change_references(removed=image_names(instance))
+
+
+@receiver(m2m_changed, sender=Disease.affected_organs.through)
+def disease_organs_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mirror Disease.affected_organs changes in the search index."""
+    _m2m_changed('organs', CatalogIndex.add_organ, CatalogIndex.remove_organ, instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Disease.geographical_area.through)
+def disease_areas_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mirror Disease.geographical_area changes in the search index."""
+    _m2m_changed('areas', CatalogIndex.add_area, CatalogIndex.remove_area, instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Disease)
+@receiver(post_delete, sender=Disease)
+@receiver(post_save, sender=DiseaseSymptom)
+@receiver(post_delete, sender=DiseaseSymptom)
+@receiver(post_save, sender=Symptom)
+@receiver(post_delete, sender=Symptom)
+@receiver(post_save, sender=Organ)
+@receiver(post_delete, sender=Organ)
+@receiver(post_save, sender=GeographicalArea)
+@receiver(post_delete, sender=GeographicalArea)
+@receiver(post_save, sender=Treatment)
+@receiver(post_delete, sender=Treatment)
+def catalog_version_changed(sender, instance, created=False, **kwargs):
+    """Invalidate cached data derived from a changed catalog object.
+
+    The disease cards showing a changed symptom, organ, area or treatment
+    are dropped before the versions are bumped, so a request in between
+    cannot cache a page built from a stale card under the new versions.
+    """
+    names, cards = [object_version_name(sender, instance.pk), table_version_name(sender)], []
+    if sender is DiseaseSymptom:
+        names.append(disease_version_name(instance.disease_id))
+    elif sender is not Disease:
+        # Disease pages show the names of related objects.
+        names.append('references')
+        if not created:
+            cards = instance.__dict__.pop('_card_ids', None)
+            if cards is None:
+                cards = cards_showing(sender, instance.pk)
+    _bump_catalog(names, cards)
+
+
+@receiver(pre_delete, sender=Symptom)
+@receiver(pre_delete, sender=Organ)
+@receiver(pre_delete, sender=GeographicalArea)
+@receiver(pre_delete, sender=Treatment)
+def card_reference_deleting(sender, instance, **kwargs):
+    """Find the disease cards showing an object before its relation rows are deleted."""
+    instance._card_ids = cards_showing(sender, instance.pk)
+
+
+@receiver(m2m_changed, sender=Disease.affected_organs.through)
+@receiver(m2m_changed, sender=Disease.geographical_area.through)
+@receiver(m2m_changed, sender=Disease.treatment.through)
+def disease_relations_version_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate cached data of diseases whose M2M relations changed."""
+    if reverse and action == 'pre_clear':
+        related = {instance._meta.model_name: instance}
+        instance._cleared_disease_ids = list(sender.objects.filter(**related).values_list('disease_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        pk_set = [instance.pk]
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_disease_ids', [])
+    _bump_catalog([disease_version_name(pk) for pk in pk_set])
+
+
+@receiver(disease_written)
+def disease_rows_written(sender, disease, symptoms, organs=None, areas=None, **kwargs):
+    """Update indexes and cached data after a bulk write of a disease."""
+    _on_commit(update_index, CatalogIndex.load_disease, disease.pk, disease.name, symptoms, organs, areas)
+    _on_commit(update_text_index, TextIndex.add, disease.pk, disease.name, disease.description)
+    _bump_catalog([disease_version_name(disease.pk), table_version_name(Disease), table_version_name(DiseaseSymptom)])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Invalidate cached group names of users whose memberships changed."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _on_commit(bump_version, user_groups_version_name(instance.pk))
+    elif action == 'post_clear':
+        # Members of a cleared group are not known any more.
+        _on_commit(bump_version, 'groups')
+    else:
+        for pk in pk_set:
+            _on_commit(bump_version, user_groups_version_name(pk))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    """Invalidate all cached group names after a group is renamed or deleted."""
+    _on_commit(bump_version, 'groups')
+
+
+def _remove_all(index, attr, pk, remove):
+    for disease_id in list(getattr(index, attr).get(pk, ())):
+        remove(index, disease_id, pk)
+
+
+def _m2m_changed(attr, add, remove, instance, action, reverse, pk_set):
+    if action == 'post_clear':
+        if reverse:
+            _on_commit(update_index, _remove_all, attr, instance.pk, remove)
+        else:
+            _on_commit(update_index, getattr(CatalogIndex, 'clear_' + attr), instance.pk)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    func = add if action == 'post_add' else remove
+    for pk in pk_set:
+        if reverse:
+            _on_commit(update_index, func, pk, instance.pk)
+        else:
+            _on_commit(update_index, func, instance.pk, pk)
+
+
+def _on_commit(func, *args):
+    """Call ``func(*args)`` once the current transaction is committed.
+
+    Versions are bumped and the in-memory indexes changed only then, so a
+    concurrent reader cannot cache rows it read before the commit under
+    the new versions, and a rolled back change leaves no trace.
+    """
+    transaction.on_commit(partial(func, *args))
+
+
+def _bump_catalog(names, cards=()):
+    """Bump the given versions and the catalog version after the commit.
+
+    The given disease cards are dropped first. The in-memory indexes were updated by the receivers above, so they are
+    marked as current instead of being rebuilt.
+    """
+    _on_commit(_bump_versions, names, cards)
+
+
+def _bump_versions(names, cards=()):
+    if cards:
+        drop_cards(cards)
+    names = [*names, CATALOG]
+    versions = dict(zip(names, bump_versions(*names)))
+    if table_version_name(Disease) in versions:
+        advance_text_index(versions[table_version_name(Disease)])
+    advance_index(versions[CATALOG])
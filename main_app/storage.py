@@ -0,0 +1,74 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+BLOBS_DIR = 'blobs'
+TEMPORARY_DIR = f'{BLOBS_DIR}/tmp'
+BLOB_NAME_RE = re.compile(r'^%s/[0-9a-f]{2}/([0-9a-f]{64})(\.[^./]+)?$' % BLOBS_DIR)
+
+
+def blob_name(digest, extension=''):
+    """Return the storage name of the content with the given SHA-256 digest."""
+    return f'{BLOBS_DIR}/{digest[:2]}/{digest}{extension.lower()}'
+
+
+def name_hash(name):
+    """Return the content hash in a blob name, None for other names."""
+    match = BLOB_NAME_RE.match(name)
+    return match.group(1) if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage which names every file by its content.
+
+    An upload is hashed while it is streamed to a temporary file and then
+    moved to ``blobs/<2 hex digits>/<SHA-256>.<ext>``; content stored
+    before is not written twice. File names never refer to different
+    content, so the media view lets browsers cache them forever.
+
+    Several fields may refer to one file, so files are never deleted when
+    a field changes: blobs.py counts the references and the
+    collect_media_garbage command deletes unreferenced files.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def save(self, name, content, max_length=None):
+        from .blobs import register_blob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        os.makedirs(self.path(TEMPORARY_DIR), exist_ok=True)
+        fd, temporary_path = tempfile.mkstemp(dir=self.path(TEMPORARY_DIR))
+        try:
+            digest, size = hashlib.sha256(), 0
+            with os.fdopen(fd, 'wb') as temporary:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temporary.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+            register_blob(name, size)
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if os.path.exists(full_path):
+                os.remove(temporary_path)
+            else:
+                os.chmod(temporary_path, self.file_permissions_mode or 0o644)
+                os.replace(temporary_path, full_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return name
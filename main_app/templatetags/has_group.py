@@ -1,5 +1,6 @@
 from django import template
-from django.contrib.auth.models import Group
+
+from main_app.authorization import has_group as user_has_group
 
 
 register = template.Library()
@@ -8,5 +9,4 @@ register = template.Library()
 @register.filter(name='has_group')
 def has_group(user, group_name):
     """Check if users in the Doctors group."""
-    group = Group.objects.get(name=group_name)
-    return True if group in user.groups.all() else False
+    return user_has_group(user, group_name)
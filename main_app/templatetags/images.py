@@ -0,0 +1,34 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from main_app.images import load_variants
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(obj, css_class='', sizes='200px', **attrs):
+    """Render the image of an organ or area with its pre-sized copies.
+
+    Browsers pick the smallest copy that fits ``sizes`` from ``srcset`` and
+    prefer the WebP copies if they support them. Extra keyword arguments
+    become attributes of the img tag.
+    """
+    attrs = {'class': css_class or None, 'src': obj.image.url, 'alt': str(obj), **attrs}
+    variants = load_variants(obj)
+    if not variants or not variants['sizes']:
+        return format_html('<img{}>', flatatt(attrs))
+
+    storage = obj.image.storage
+    srcset = [(storage.url(name), width) for width, name, webp_name in variants['sizes']]
+    srcset.append((obj.image.url, variants['width']))
+    attrs.update(src=srcset[0][0], srcset=format_html_join(', ', '{} {}w', srcset), sizes=sizes)
+    webp = [(storage.url(webp_name), width) for width, name, webp_name in variants['sizes'] if webp_name]
+    if not webp:
+        return format_html('<img{}>', flatatt(attrs))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+        format_html_join(', ', '{} {}w', webp), sizes, flatatt(attrs)
+    )
@@ -1,11 +1,24 @@
 import os
+import socketserver
 import sys
+import threading
 
 import pytest
 
+from django.core.cache import cache
+from django.db import transaction
 from django.test import Client
 
-from main_app.models import User
+from main_app.models import (
+    Disease, DiseaseSymptom, GeographicalArea,
+    Organ, Symptom, Treatment, User
+)
+from main_app.choices import reset_choices
+from main_app.fulltext import reset_text_index
+from main_app.index import reset_index
+from main_app.search import search_cache
+from main_app.typeahead import reset_prefix_indexes
+from main_app.versioning import forget_versions
 
 
 sys.path.append(os.path.dirname(__file__))
@@ -29,3 +42,134 @@ def user():
         medical_license=True
     )
     return user
+
+
+@pytest.fixture(autouse=True)
+def run_on_commit(request, monkeypatch):
+    """Run on_commit callbacks at once, as the test transaction is never committed.
+
+    Tests marked ``django_db(transaction=True)`` commit for real and keep
+    Django's behaviour.
+    """
+    marker = request.node.get_closest_marker('django_db')
+    if marker is None or not marker.kwargs.get('transaction'):
+        monkeypatch.setattr(transaction, 'on_commit', lambda func, using=None: func())
+
+
+@pytest.fixture(autouse=True)
+def clear_caches(request):
+    """Drop cached data and in-memory indexes left over from other tests.
+
+    Tests use the configured cache backend; the database cache is only
+    cleared by tests which may access the database.
+    """
+    uses_db = request.node.get_closest_marker('django_db') is not None
+    if uses_db:
+        cache.clear()
+    reset_index()
+    reset_text_index()
+    reset_prefix_indexes()
+    reset_choices()
+    search_cache.clear()
+    forget_versions()
+    yield
+    if uses_db:
+        cache.clear()
+    reset_index()
+    reset_text_index()
+    reset_prefix_indexes()
+    reset_choices()
+    search_cache.clear()
+    forget_versions()
+
+
+@pytest.fixture
+def catalog():
+    """Return a small catalog with diseases, symptoms, organs and areas."""
+    heart = Organ.objects.create(name='Heart', description='Heart', image='organs/heart.jpg')
+    lungs = Organ.objects.create(name='Lungs', description='Lungs', image='organs/lungs.jpg')
+    europe = GeographicalArea.objects.create(area='Europe', image='geographical_area/europe.png')
+    asia = GeographicalArea.objects.create(area='Asia', image='geographical_area/asia.png')
+    cough = Symptom.objects.create(name='Cough', affected_organ=lungs)
+    fever = Symptom.objects.create(name='Fever')
+    pain = Symptom.objects.create(name='Chest pain', affected_organ=heart)
+    rest = Treatment.objects.create(treatment='Rest')
+
+    flu = Disease.objects.create(name='Flu', description='Viral infection')
+    flu.affected_organs.set([lungs])
+    flu.geographical_area.set([europe, asia])
+    flu.treatment.set([rest])
+    DiseaseSymptom.objects.create(disease=flu, symptom=cough, symptom_frequency=3)
+    DiseaseSymptom.objects.create(disease=flu, symptom=fever, symptom_frequency=5)
+
+    angina = Disease.objects.create(name='Angina', description='Chest pain')
+    angina.affected_organs.set([heart])
+    angina.geographical_area.set([europe])
+    DiseaseSymptom.objects.create(disease=angina, symptom=pain, symptom_frequency=5)
+    DiseaseSymptom.objects.create(disease=angina, symptom=fever, symptom_frequency=1)
+
+    bronchitis = Disease.objects.create(name='Bronchitis', description='Airway inflammation')
+    bronchitis.affected_organs.set([lungs])
+    bronchitis.geographical_area.set([asia])
+    bronchitis.treatment.set([rest])
+    DiseaseSymptom.objects.create(disease=bronchitis, symptom=cough, symptom_frequency=5)
+
+    return {
+        'organs': {'heart': heart, 'lungs': lungs},
+        'areas': {'europe': europe, 'asia': asia},
+        'symptoms': {'cough': cough, 'fever': fever, 'pain': pain},
+        'treatments': {'rest': rest},
+        'diseases': {'flu': flu, 'angina': angina, 'bronchitis': bronchitis},
+    }
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP to accept messages from smtplib."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self.reply('250 localhost')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(data_line)
+                self.server.messages.append((recipients, b''.join(data).decode()))
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(settings):
+    """Run a local SMTP stand-in and point the email settings at it."""
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.connections, server.messages = 0, []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = server.server_address
+    settings.EMAIL_HOST_USER = settings.EMAIL_HOST_PASSWORD = ''
+    settings.EMAIL_USE_TLS = False
+    yield server
+    server.shutdown()
+    server.server_close()
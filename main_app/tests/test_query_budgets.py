@@ -0,0 +1,183 @@
+"""Query, time and size budgets for every route of medical_app/urls.py.
+
+Budgets live in query_budgets.json next to this file. After an intended
+change run ``UPDATE_QUERY_BUDGETS=1 pytest main_app/tests/test_query_budgets.py``
+and commit the updated file together with the change.
+
+Query counts and response sizes are always checked. Wall-clock times
+depend on the machine, so they are only checked with
+``QUERY_BUDGET_TIMING=1``.
+"""
+import json
+import os
+import time
+from collections import Counter
+
+import pytest
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from main_app.cards import rebuild_cards
+from main_app.generator import CatalogGenerator
+from main_app.models import (
+    Disease, DiseaseSymptom, GeographicalArea,
+    Organ, OutgoingEmail, Symptom, Treatment, User
+)
+from main_app.query import Query
+from main_app.querycheck import fingerprint
+
+
+BUDGETS_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+UPDATE_BUDGETS = bool(os.environ.get('UPDATE_QUERY_BUDGETS'))
+CHECK_TIME = bool(os.environ.get('QUERY_BUDGET_TIMING'))
+
+# Headroom given to time and size budgets when they are recorded.
+TIME_FACTOR, TIME_SLACK_MS = 5, 250
+SIZE_FACTOR = 1.25
+
+
+def route_requests(doctor):
+    """Return (name, method, url, data) for every route under budget."""
+    disease = Disease.objects.order_by('pk').first()
+    symptoms = list(disease.symptoms.values_list('pk', flat=True)[:3])
+    organs = list(disease.affected_organs.values_list('pk', flat=True))
+    areas = list(disease.geographical_area.values_list('pk', flat=True))
+    wizard_step_1 = {
+        'disease_create_view-current_step': '0',
+        '0-name': 'New disease',
+        '0-description': 'Description',
+        '0-affected_organs': organs,
+        '0-geographical_area': areas,
+        '0-treatment': list(Treatment.objects.values_list('pk', flat=True)[:1]),
+    }
+    requests = [
+        ('home_page', 'get', reverse('home_page'), None),
+        ('authorization', 'get', reverse('authorization'), None),
+        ('contact_page', 'get', reverse('contact_page'), None),
+        ('change_data', 'get', reverse('change_data', args=[doctor.pk]), None),
+        ('change_password', 'get', reverse('change_password', args=[doctor.pk]), None),
+        ('diseases_list', 'get', reverse('diseases_list'), None),
+        ('diseases_list_text_search', 'get', reverse('diseases_list') + '?q=disease', None),
+        ('disease_details', 'get', reverse('disease_details', args=[disease.pk]), None),
+        ('diseases_export', 'get', reverse('diseases_export'), None),
+        ('add_disease_step_1', 'get', reverse('add_disease'), None),
+        ('add_disease_step_2', 'post', reverse('add_disease'), wizard_step_1),
+        ('search_disease', 'get', reverse('search_disease'), None),
+        ('search_disease_results', 'post', reverse('search_disease'), {
+            'symptoms': symptoms, 'affected_organs': organs, 'geographical_area': areas,
+        }),
+        ('search_disease_query', 'get', reverse('search_disease') + '?' + urlencode({
+            'q': str(Query.from_filters(symptoms, organs, areas)),
+        }), None),
+        ('geographical_areas_list', 'get', reverse('geographical_areas_list'), None),
+        ('log_in', 'get', reverse('log_in'), None),
+        ('metrics', 'get', reverse('metrics'), None),
+        ('organs_list', 'get', reverse('organs_list'), None),
+        ('add_organ', 'get', reverse('add_organ'), None),
+        ('registration', 'get', reverse('registration'), None),
+        ('symptoms_list', 'get', reverse('symptoms_list'), None),
+        ('treatments_list', 'get', reverse('treatments_list'), None),
+        ('api_diseases', 'get', reverse('api_diseases'), None),
+        ('api_disease', 'get', reverse('api_disease', args=[disease.pk]), None),
+        ('api_geographical_areas', 'get', reverse('api_geographical_areas'), None),
+        ('api_geographical_area', 'get', reverse('api_geographical_area', args=[areas[0]]), None),
+        ('api_organs', 'get', reverse('api_organs'), None),
+        ('api_organ', 'get', reverse('api_organ', args=[organs[0]]), None),
+        ('api_symptoms', 'get', reverse('api_symptoms'), None),
+        ('api_symptom', 'get', reverse('api_symptom', args=[symptoms[0]]), None),
+        ('api_treatments', 'get', reverse('api_treatments'), None),
+        ('api_treatment', 'get', reverse('api_treatment', args=wizard_step_1['0-treatment']), None),
+        ('typeahead', 'get', reverse('typeahead', args=['symptoms']), {'q': 'a'}),
+        ('admin_index', 'get', reverse('admin:index'), None),
+    ]
+    for model in (Disease, DiseaseSymptom, GeographicalArea, Organ, OutgoingEmail, Symptom, Treatment, User):
+        name = f'admin:main_app_{model._meta.model_name}_changelist'
+        requests.append((name, 'get', reverse(name), None))
+    # Last, as it ends the session.
+    requests.append(('logout', 'get', reverse('logout'), None))
+    return requests
+
+
+def measure(client, method, url, data):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = getattr(client, method)(url, data)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        elapsed = (time.perf_counter() - start) * 1000
+    return response, {
+        'queries': len(queries),
+        'time_ms': elapsed,
+        'bytes': len(content),
+        'sql': [query['sql'] for query in queries.captured_queries],
+    }
+
+
+def checked_fields():
+    """Return (measured field, budget field) pairs which are checked."""
+    fields = [('queries', 'queries'), ('bytes', 'max_bytes')]
+    if CHECK_TIME:
+        fields.append(('time_ms', 'max_time_ms'))
+    return fields
+
+
+def format_report(name, measured, budget):
+    """Return a readable description of how a route broke its budget."""
+    lines = [f'Route {name!r} is over budget:']
+    for field, limit in (('queries', 'queries'), ('time_ms', 'max_time_ms'), ('bytes', 'max_bytes')):
+        marker = '  <-- over' if (field, limit) in checked_fields() and measured[field] > budget[limit] else ''
+        lines.append(f'  {field:>8}: {measured[field]:>10.0f} (budget {budget[limit]}){marker}')
+    if measured['queries'] > budget['queries']:
+        lines.append('  most frequent query shapes:')
+        shapes = Counter(fingerprint(sql) for sql in measured['sql'])
+        for sql, count in shapes.most_common(5):
+            lines.append(f'    {count} x {sql[:160]}')
+    return '\n'.join(lines)
+
+
+@pytest.fixture
+def doctor():
+    """Return a superuser from the Doctors group."""
+    doctors = Group.objects.create(name='Doctors')
+    Group.objects.create(name='Patients')
+    user = User.objects.create_superuser(
+        username='doctor', email='doctor@example.com', password='password2021',
+        first_name='Doc', last_name='Tor'
+    )
+    user.groups.add(doctors)
+    return user
+
+
+@pytest.mark.django_db
+def test_routes_stay_within_budgets(client, doctor):
+    # Several pages of every list and several chunks of the export, so
+    # costs which grow with the catalog show up in the budgets.
+    CatalogGenerator(seed=2021).generate(diseases=2000, symptoms=500, organs=120, areas=60, treatments=150)
+    rebuild_cards()
+    client.force_login(doctor)
+    with open(BUDGETS_PATH) as budgets_file:
+        budgets = json.load(budgets_file)
+
+    failures, measurements = [], {}
+    for name, method, url, data in route_requests(doctor):
+        response, measured = measure(client, method, url, data)
+        assert response.status_code in (200, 302), f'{name}: unexpected status {response.status_code}'
+        measurements[name] = {
+            'queries': measured['queries'],
+            'max_time_ms': int(measured['time_ms'] * TIME_FACTOR + TIME_SLACK_MS),
+            'max_bytes': int(measured['bytes'] * SIZE_FACTOR),
+        }
+        if name not in budgets:
+            failures.append(f'Route {name!r} has no budget.')
+        elif any(measured[field] > budgets[name][limit] for field, limit in checked_fields()):
+            failures.append(format_report(name, measured, budgets[name]))
+
+    if UPDATE_BUDGETS:
+        with open(BUDGETS_PATH, 'w') as budgets_file:
+            json.dump(measurements, budgets_file, indent=2, sort_keys=True)
+            budgets_file.write('\n')
+        return
+    assert not failures, '\n\n'.join(failures)
@@ -1,12 +1,44 @@
+import json
+import re
+from datetime import timedelta
+from io import BytesIO, StringIO
+
 import pytest
+from PIL import Image
 
 from django.contrib import auth
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
 from django.urls import reverse
+from django.utils import timezone
 
+from main_app import signals
+from main_app.authorization import has_group
+from main_app.blobs import collect_garbage, recount_references
+from main_app.forms import DiseaseCreateForm, DiseaseFormSet, DiseaseSearchForm, SymptomCreateForm
+from main_app.fulltext import TextIndex
+from main_app.cards import card_chunks, get_card, rebuild_cards
+from main_app.generator import CatalogGenerator, clear_catalog
+from main_app.index import Bitset, CatalogIndex, get_index
+from main_app.mailqueue import queue_mail, send_queued_mail
+from main_app.metrics import registry
 from main_app.models import (
-    Disease, DiseaseSymptom, GeographicalArea, 
-    Organ, Symptom, Treatment, User
+    Disease, DiseaseCard, DiseaseSymptom, GeographicalArea, 
+    Organ, OutgoingEmail, StoredBlob, Symptom, Treatment, User, Version
+)
+from main_app.pagination import encode_cursor
+from main_app.query import Query, QuerySyntaxError
+from main_app.querycheck import QueryRecorder, fingerprint
+from main_app.search import SearchResultCache, query_diseases, rank_diseases, search_cache
+from main_app.versioning import (
+    CATALOG, GENERATION, bump_version, disease_version_name, get_versions, remember_versions
 )
+from main_app.writers import set_disease_symptoms
 
 
 @pytest.mark.django_db
@@ -105,3 +137,835 @@ def test_change_data_view(client, user):
         'last_name': 'Name',
     })
     assert response.status_code == 302
+
+
+@pytest.mark.django_db
+def test_search_disease_ranks_by_symptom_frequency(client, catalog):
+    url = reverse('search_disease')
+    symptoms = catalog['symptoms']
+    response = client.post(url, {'symptoms': [symptoms['cough'].pk, symptoms['fever'].pk]})
+    names = [disease.name for disease in response.context['diseases']]
+    assert response.status_code == 200
+    assert names == ['Flu', 'Bronchitis', 'Angina']
+
+
+@pytest.mark.django_db
+def test_search_disease_filters_by_organ_and_area(client, catalog):
+    url = reverse('search_disease')
+    response = client.post(url, {
+        'symptoms': [catalog['symptoms']['fever'].pk],
+        'affected_organs': [catalog['organs']['lungs'].pk, catalog['organs']['heart'].pk],
+        'geographical_area': [catalog['areas']['asia'].pk],
+    })
+    names = [disease.name for disease in response.context['diseases']]
+    assert names == ['Flu']
+
+
+@pytest.mark.django_db
+def test_search_disease_sees_new_diseases(client, catalog):
+    url = reverse('search_disease')
+    client.post(url, {'symptoms': [catalog['symptoms']['pain'].pk]})
+    disease = Disease.objects.create(name='Myocarditis', description='Inflammation')
+    DiseaseSymptom.objects.create(disease=disease, symptom=catalog['symptoms']['pain'], symptom_frequency=4)
+    response = client.post(url, {'symptoms': [catalog['symptoms']['pain'].pk]})
+    names = [disease.name for disease in response.context['diseases']]
+    assert names == ['Angina', 'Myocarditis']
+
+
+@pytest.mark.django_db
+def test_search_results_are_cached_per_catalog_version(catalog):
+    cough, fever = catalog['symptoms']['cough'], catalog['symptoms']['fever']
+    first = rank_diseases([cough.pk, fever.pk])
+    assert search_cache.stats()['misses'] == 1
+    assert [d.name for d in rank_diseases([str(fever.pk), str(cough.pk), cough.pk])] == [d.name for d in first]
+    assert search_cache.stats()['hits'] == 1
+
+    Disease.objects.create(name='Cold', description='Common cold')
+    rank_diseases([cough.pk, fever.pk])
+    assert search_cache.stats()['misses'] == 2
+
+
+def test_search_result_cache_evicts_least_recently_used():
+    results = SearchResultCache(size=2)
+    for key in ('a', 'b', 'a', 'c'):
+        results.get_or_rank(key, lambda: [(1, 0)])
+    assert list(results.entries) == ['a', 'c']
+    assert results.stats()['hits'] == 1 and results.stats()['evictions'] == 1
+
+
+@pytest.mark.django_db
+def test_search_result_cache_shares_results_through_backend():
+    SearchResultCache(backend='default').get_or_rank('key', lambda: [(1, 5)])
+    other = SearchResultCache(backend='default')
+    assert other.get_or_rank('key', lambda: []) == ((1, 5),)
+    assert other.stats()['shared_hits'] == 1
+
+
+def test_query_canonical_form():
+    query = Query.parse('o:2 and (s:7 OR s:12>=3 or s:7) AND NOT NOT a:5 s:1>=0')
+    assert str(query) == 's:1 AND o:2 AND a:5 AND (s:7 OR s:12>=3)'
+    assert str(Query.parse('s:1 AND (s:2 AND NOT (a:1 OR a:1))')) == 's:1 AND s:2 AND NOT a:1'
+    assert str(Query.parse('')) == ''
+    for text in ('s:1 AND', '(s:1', 'o:1>=2', 'x:1', 's:1 XOR s:2'):
+        with pytest.raises(QuerySyntaxError):
+            Query.parse(text)
+
+
+@pytest.mark.django_db
+def test_query_evaluates_boolean_operators_and_frequency(catalog):
+    symptoms, diseases = catalog['symptoms'], catalog['diseases']
+
+    def names(text):
+        return sorted(disease.name for disease in query_diseases(Query.parse(text)))
+
+    assert names(f's:{symptoms["fever"].pk} AND NOT a:{catalog["areas"]["asia"].pk}') == ['Angina']
+    assert names(f's:{symptoms["fever"].pk}>=3 OR o:{catalog["organs"]["heart"].pk}') == ['Angina', 'Flu']
+    assert names(f'NOT s:{symptoms["cough"].pk}') == ['Angina']
+    assert len(names('')) == len(diseases)
+
+    heart = catalog['organs']['heart']
+    Disease.objects.create(name='Carditis', description='No symptoms recorded').affected_organs.add(heart)
+    assert names(f's:{symptoms["pain"].pk} OR o:{heart.pk}') == ['Angina', 'Carditis']
+
+
+@pytest.mark.django_db
+def test_search_disease_get_redirects_to_canonical_url(client, catalog, user):
+    url = reverse('search_disease')
+    cough, fever = catalog['symptoms']['cough'], catalog['symptoms']['fever']
+    canonical = f'{url}?q=s%3A{cough.pk}+OR+s%3A{fever.pk}'
+
+    response = client.get(url, {'symptoms': [fever.pk, cough.pk], 'min_frequency': '0'})
+    assert response.status_code == 301 and response['Location'] == canonical
+    response = client.get(url, {'q': f's:{fever.pk}  or s:{cough.pk}'})
+    assert response.status_code == 301 and response['Location'] == canonical
+
+    response = client.get(canonical)
+    assert response.status_code == 200
+    assert [disease.name for disease in response.context['diseases']] == ['Flu', 'Bronchitis', 'Angina']
+    assert 'public' in response['Cache-Control'] and 'Cookie' in response['Vary']
+    assert client.get(canonical, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    client.force_login(user)
+    response = client.get(canonical)
+    assert 'private' in response['Cache-Control'] and 'public' not in response['Cache-Control']
+    client.logout()
+
+    Disease.objects.create(name='Cold', description='Common cold')
+    assert client.get(canonical, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 200
+    assert client.get(url, {'q': 's:1 AND'}).status_code == 400
+    assert client.get(url, {'q': '(' * 2000 + 's:1' + ')' * 2000}).status_code == 400
+    assert client.get(url, {'q': 's:' + '9' * 5000}).status_code == 400
+
+
+def test_bitset_operations():
+    left = Bitset([1, 5, 2000, 70000])
+    right = Bitset([5, 2000, 3])
+    assert list(left & right) == [5, 2000]
+    assert list(left | right) == [1, 3, 5, 2000, 70000]
+    left.discard(70000)
+    assert 70000 not in left and len(left) == 3
+
+
+@pytest.mark.django_db
+def test_catalog_index_is_updated_incrementally(catalog):
+    index = get_index()
+    lungs = catalog['organs']['lungs']
+    flu = catalog['diseases']['flu']
+    assert set(index.filter(organs=[lungs.pk])) == {flu.pk, catalog['diseases']['bronchitis'].pk}
+
+    lungs.disease_set.clear()
+    flu.affected_organs.add(lungs)
+    DiseaseSymptom.objects.filter(disease=flu, symptom=catalog['symptoms']['cough']).delete()
+
+    assert get_index() is index
+    assert set(index.filter(organs=[lungs.pk])) == {flu.pk}
+    assert set(index.filter(symptoms=[catalog['symptoms']['cough'].pk])) == {catalog['diseases']['bronchitis'].pk}
+
+
+@pytest.mark.django_db
+def test_paginated_lists_have_no_client_side_filter(client, catalog):
+    # A filter in the browser would only search the current page.
+    for name in ('symptoms_list', 'organs_list', 'treatments_list', 'geographical_areas_list'):
+        content = client.get(reverse(name)).content
+        assert b'id="searchInput"' not in content and b'id="myInput"' not in content
+
+
+@pytest.mark.django_db
+def test_diseases_list_text_search(client, catalog):
+    url = reverse('diseases_list')
+    response = client.get(url, {'q': 'viral infection'})
+    names = [disease.name for disease in response.context['diseases']]
+    assert response.status_code == 200
+    assert names == ['Flu']
+
+
+@pytest.mark.django_db
+def test_diseases_list_fuzzy_search_ranks_name_matches_first(client, catalog):
+    Disease.objects.create(name='Chronic cough', description='Long lasting bronchitis')
+    url = reverse('diseases_list')
+    response = client.get(url, {'q': 'bronchitsi'})
+    names = [disease.name for disease in response.context['diseases']]
+    assert names == ['Bronchitis', 'Chronic cough']
+
+
+def test_text_index_removes_replaced_terms():
+    index = TextIndex()
+    index.add(1, 'Flu', 'Viral infection')
+    index.add(2, 'Angina', 'Chest pain')
+    index.add(1, 'Influenza', 'Viral fever')
+    assert index.search('infection') == [] and index.search('fever') == [1]
+    assert 'infection' not in index.postings and index.lengths == {1: 5, 2: 5}
+
+    index.remove(2)
+    assert index.search('chest') == [] and set(index.postings) == {'influenza', 'viral', 'fever'}
+
+
+@pytest.mark.django_db
+def test_diseases_list_text_search_is_paginated(client):
+    for i in range(60):
+        Disease.objects.create(name=f'Fever {i}', description='')
+    url = reverse('diseases_list')
+    response = client.get(url, {'q': 'fever', 'page': 2})
+    assert response.context['is_paginated']
+    assert len(response.context['diseases']) == 10
+
+
+@pytest.mark.django_db
+def test_treatments_list_keyset_pagination(client):
+    Treatment.objects.bulk_create(Treatment(treatment=f'Treatment {i:03}') for i in range(120))
+    url = reverse('treatments_list')
+    seen, params = [], {}
+    while True:
+        response = client.get(url, params)
+        page = response.context['page_obj']
+        seen += [treatment.treatment for treatment in response.context['treatments']]
+        if not page.has_next():
+            break
+        params = {'after': page.next_cursor}
+    assert seen == [f'Treatment {i:03}' for i in range(120)]
+
+    response = client.get(url, {'before': page.previous_cursor})
+    names = [treatment.treatment for treatment in response.context['treatments']]
+    assert names == [f'Treatment {i:03}' for i in range(50, 100)]
+
+
+@pytest.mark.django_db
+def test_list_view_invalid_cursor(client):
+    response = client.get(reverse('organs_list'), {'after': 'not-a-cursor'})
+    assert response.status_code == 404
+    for values in (['a', 'x'], [['a'], 1], ['a', True], ['a', 10 ** 30], [-10 ** 30, 1], [float('inf'), 1]):
+        response = client.get(reverse('treatments_list'), {'after': encode_cursor(values)})
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_disease_details_view(client, catalog):
+    flu = catalog['diseases']['flu']
+    url = reverse('disease_details', args=[flu.pk])
+    call_command('rebuild_disease_cards', stdout=StringIO())
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert response.status_code == 200
+    # The card is read instead of the disease and its relations.
+    tables = {table for query in queries.captured_queries for table in re.findall(r'FROM "(\w+)"', query['sql'])}
+    assert 'main_app_diseasecard' in tables and not tables & {'main_app_disease', 'main_app_diseasesymptom'}
+    assert b'Cough' in response.content and b'Europe' in response.content
+
+
+@pytest.mark.django_db
+def test_disease_details_view_is_cached_until_disease_changes(client, catalog, django_assert_num_queries):
+    flu = catalog['diseases']['flu']
+    url = reverse('disease_details', args=[flu.pk])
+    client.get(url)
+    # The versions and the cached page.
+    with django_assert_num_queries(2):
+        client.get(url)
+
+    DiseaseSymptom.objects.create(disease=flu, symptom=catalog['symptoms']['pain'], symptom_frequency=2)
+    assert b'Chest pain' in client.get(url).content
+
+    catalog['organs']['lungs'].disease_set.clear()
+    assert b'Lungs' not in client.get(url).content
+
+    catalog['symptoms']['pain'].name = 'Thoracic pain'
+    catalog['symptoms']['pain'].save()
+    assert b'Thoracic pain' in client.get(url).content
+
+
+@pytest.mark.django_db
+def test_disease_details_view_not_found(client):
+    response = client.get(reverse('disease_details', args=[1]))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_catalog_generator_is_deterministic():
+    generated = CatalogGenerator(seed=1).generate(diseases=30, symptoms=20, organs=5, areas=4, treatments=6)
+    fields = ('disease_id', 'symptom_id', 'symptom_frequency')
+    rows = list(DiseaseSymptom.objects.order_by(*fields).values_list(*fields))
+    assert Disease.objects.count() == 30
+    assert len(generated['symptoms']) == Symptom.objects.count() == 20
+
+    clear_catalog()
+    CatalogGenerator(seed=1).generate(diseases=30, symptoms=20, organs=5, areas=4, treatments=6)
+    offset = Disease.objects.order_by('pk').first().pk - rows[0][0]
+    symptom_offset = Symptom.objects.order_by('pk').first().pk - generated['symptoms'][0]
+    shifted = DiseaseSymptom.objects.order_by(*fields).values_list(*fields)
+    assert [(d - offset, s - symptom_offset, f) for d, s, f in shifted] == rows
+    assert Disease.objects.create(name='New', description='').pk == offset + 31
+
+
+@pytest.mark.django_db
+def test_has_group_is_cached_until_membership_changes(user, django_assert_num_queries):
+    doctors = Group.objects.create(name='Doctors')
+    assert not has_group(User.objects.get(pk=user.pk), 'Doctors')
+
+    user.groups.add(doctors)
+    assert has_group(User.objects.get(pk=user.pk), 'Doctors')
+    other_request_user = User.objects.get(pk=user.pk)
+    # The versions and the cached names, once per request.
+    with django_assert_num_queries(2):
+        assert has_group(other_request_user, 'Doctors')
+        assert not has_group(other_request_user, 'Patients')
+
+    doctors.user_set.remove(user)
+    assert not has_group(User.objects.get(pk=user.pk), 'Doctors')
+
+
+@pytest.mark.django_db
+def test_organ_create_view_requires_doctor(client, user):
+    url = reverse('add_organ')
+    client.force_login(user)
+    assert client.get(url).status_code == 403
+
+    user.groups.add(Group.objects.create(name='Doctors'))
+    assert client.get(url).status_code == 200
+
+
+@pytest.mark.django_db
+def test_disease_create_wizard_creates_disease_once(client, user, catalog):
+    user.groups.add(Group.objects.create(name='Doctors'))
+    client.force_login(user)
+    url = reverse('add_disease')
+    symptoms = catalog['symptoms']
+    client.post(url, {
+        'disease_create_view-current_step': '0',
+        '0-name': 'Pneumonia',
+        '0-description': 'Lung infection',
+        '0-affected_organs': [catalog['organs']['lungs'].pk],
+        '0-geographical_area': [catalog['areas']['europe'].pk],
+        '0-treatment': [catalog['treatments']['rest'].pk],
+    })
+    step_2 = {
+        'disease_create_view-current_step': '1',
+        '1-TOTAL_FORMS': '10', '1-INITIAL_FORMS': '0',
+        '1-MIN_NUM_FORMS': '0', '1-MAX_NUM_FORMS': '1000',
+    }
+    for i in range(10):
+        step_2.update({f'1-{i}-symptom': '', f'1-{i}-symptom_frequency': '0'})
+    step_2.update({
+        '1-0-symptom': symptoms['cough'].pk, '1-0-symptom_frequency': '5',
+        '1-1-symptom': symptoms['fever'].pk, '1-1-symptom_frequency': '4',
+    })
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post(url, step_2)
+    inserts = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "main_app_disease')]
+
+    assert response.status_code == 302
+    assert len(inserts) == 5
+    disease = Disease.objects.get(name='Pneumonia')
+    rows = DiseaseSymptom.objects.filter(disease=disease).values_list('symptom__name', 'symptom_frequency')
+    assert sorted(rows) == [('Cough', 5), ('Fever', 4)]
+    assert list(disease.treatment.all()) == [catalog['treatments']['rest']]
+    found = client.post(reverse('search_disease'), {'symptoms': [symptoms['cough'].pk]}).context['diseases']
+    assert [found_disease.name for found_disease in found] == ['Bronchitis', 'Pneumonia', 'Flu']
+
+
+@pytest.mark.django_db
+def test_disease_forms_reuse_cached_choices(catalog, django_assert_num_queries):
+    cough = catalog['symptoms']['cough']
+    # As in a request, which reads every version once.
+    remember_versions()
+    str(DiseaseFormSet(prefix='1'))
+    formset = DiseaseFormSet(initial=[{'symptom': cough.pk}], prefix='1')
+    with django_assert_num_queries(0):
+        html = str(formset)
+    assert html.count(f'<option value="{cough.pk}">Cough</option>') == 10
+    assert html.count(f'<option value="{cough.pk}" selected>Cough</option>') == 1
+    assert html.count('<option value="">---------</option>') == 11
+
+    lungs = catalog['organs']['lungs']
+    str(DiseaseCreateForm())
+    with django_assert_num_queries(0):
+        html = str(DiseaseCreateForm(initial={'affected_organs': [lungs.pk]}))
+    assert f'name="affected_organs" value="{lungs.pk}" checked' in html
+    assert html.count(' checked') == 1
+
+    Symptom.objects.create(name='Wheezing')
+    assert 'Wheezing' in str(DiseaseFormSet(prefix='1'))
+
+
+@pytest.mark.django_db
+def test_set_disease_symptoms_replaces_rows(catalog):
+    flu = catalog['diseases']['flu']
+    get_index()
+    set_disease_symptoms(flu, [('Chest pain', 2), (catalog['symptoms']['fever'].pk, 1)])
+    rows = DiseaseSymptom.objects.filter(disease=flu).values_list('symptom__name', 'symptom_frequency')
+    assert sorted(rows) == [('Chest pain', 2), ('Fever', 1)]
+    assert flu.pk not in get_index().filter(symptoms=[catalog['symptoms']['cough'].pk])
+    with pytest.raises(Symptom.DoesNotExist):
+        set_disease_symptoms(flu, [('Unknown', 2)])
+
+
+@pytest.mark.django_db
+def test_import_catalog_jsonl(tmp_path, catalog):
+    path = tmp_path / 'diseases.jsonl'
+    path.write_text(
+        '{"name": "Pneumonia", "description": "Lung infection", "affected_organs": ["Lungs"],'
+        ' "geographical_area": ["Asia"], "treatment": ["Rest"],'
+        ' "symptoms": [{"name": "Cough", "frequency": 5}, ["Fever", 4]]}\n'
+        '\n'
+        '{"name": "Unknown", "symptoms": [["sneezing", 2]]}\n'
+        '{"name": "Broken",\n'
+        '{"name": "Too often", "symptoms": [{"name": "Cough", "frequency": 9}]}\n'
+        '{"name": "Cold", "symptoms": [["Fever", "2"]], "treatment": "Rest"}\n'
+        '{"name": "Cold", "symptoms": [["Fever", "2"]]}\n'
+    )
+    errors = StringIO()
+    call_command('import_catalog', str(path), batch_size=1, stdout=StringIO(), stderr=errors)
+    lines = errors.getvalue().splitlines()
+    assert lines[0] == 'Record 2: unknown symptoms sneezing, skipped.'
+    assert lines[1].startswith('Record 3: invalid JSON')
+    assert lines[2:] == ['Record 4: invalid symptom frequency 9, skipped.', 'Record 5: invalid treatment, skipped.']
+    assert Disease.objects.get(name='Cold').diseasesymptom_set.get().symptom_frequency == 2
+
+    disease = Disease.objects.get(name='Pneumonia')
+    assert dict(disease.diseasesymptom_set.values_list('symptom__name', 'symptom_frequency')) == {'Cough': 5, 'Fever': 4}
+    assert [organ.name for organ in disease.affected_organs.all()] == ['Lungs']
+    assert not Disease.objects.filter(name='Unknown').exists()
+    assert not (tmp_path / 'diseases.jsonl.checkpoint').exists()
+
+
+@pytest.mark.django_db
+def test_import_catalog_csv_resumes_from_checkpoint(tmp_path, catalog):
+    path = tmp_path / 'diseases.csv'
+    path.write_text(
+        'name,description,symptoms,affected_organs,geographical_area,treatment\n'
+        'Asthma,Airways,Cough:4;Wheezing:3,Lungs,Europe;Asia,\n'
+        'Pericarditis,Heart lining,Chest pain:5,Heart,Europe,Rest\n'
+        'Myocarditis,Heart muscle,Chest pain:often,Heart,Europe,Rest\n'
+    )
+    (tmp_path / 'diseases.csv.checkpoint').write_text('1')
+    errors = StringIO()
+    call_command('import_catalog', str(path), resume=True, create_missing=True, stdout=StringIO(), stderr=errors)
+
+    assert errors.getvalue() == 'Record 3: invalid symptom frequency often, skipped.\n'
+    assert not Disease.objects.filter(name__in=['Asthma', 'Myocarditis']).exists()
+    disease = Disease.objects.get(name='Pericarditis')
+    assert list(disease.symptoms.values_list('name', flat=True)) == ['Chest pain']
+    assert list(disease.treatment.values_list('treatment', flat=True)) == ['Rest']
+
+
+@pytest.mark.django_db
+def test_diseases_export_streams_ndjson(client, catalog):
+    response = client.get(reverse('diseases_export'))
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/x-ndjson'
+    records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert [record['name'] for record in records] == ['Flu', 'Angina', 'Bronchitis']
+    assert records[0]['symptoms'] == [{'name': 'Fever', 'frequency': 5}, {'name': 'Cough', 'frequency': 3}]
+    assert records[0]['geographical_area'] == ['Asia', 'Europe']
+
+
+@pytest.mark.django_db
+def test_api_disease_details(client, catalog):
+    flu = catalog['diseases']['flu']
+    response = client.get(reverse('api_disease', args=[flu.pk]))
+    assert response.status_code == 200
+    data = response.json()
+    assert [(row['name'], row['frequency']) for row in data['symptoms']] == [('Fever', 5), ('Cough', 3)]
+    assert [organ['name'] for organ in data['affected_organs']] == ['Lungs']
+
+
+@pytest.mark.django_db
+def test_api_list_pages_by_primary_key(client, catalog):
+    url = reverse('api_diseases')
+    response = client.get(url, {'after': catalog['diseases']['flu'].pk})
+    assert [row['name'] for row in response.json()['results']] == ['Angina', 'Bronchitis']
+    assert response.json()['next'] is None
+    for after in ('x', 10 ** 30, -10 ** 30):
+        assert client.get(url, {'after': after}).status_code == 404
+
+
+@pytest.mark.django_db
+def test_ids_out_of_bigint_range_are_not_found(client):
+    for url in ('/api/diseases/{}/', '/api/organs/{}/', '/diseases/{}/'):
+        assert client.get(url.format(10 ** 25)).status_code == 404
+        assert client.get(url.format(2 ** 63 - 1)).status_code == 404
+
+
+@pytest.mark.django_db
+def test_api_conditional_get_answers_not_modified(client, catalog, django_assert_num_queries):
+    flu = catalog['diseases']['flu']
+    url = reverse('api_disease', args=[flu.pk])
+    response = client.get(url)
+    etag = response['ETag']
+    assert response['Last-Modified']
+
+    # The versions with their modification times.
+    with django_assert_num_queries(1):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    catalog['symptoms']['fever'].save()
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_index_keeps_total_symptom_weights(catalog):
+    flu, symptoms = catalog['diseases']['flu'], catalog['symptoms']
+    assert get_index().total_weights[flu.pk] == 3 + 5
+
+    DiseaseSymptom.objects.filter(disease=flu, symptom=symptoms['cough']).delete()
+    DiseaseSymptom.objects.create(disease=flu, symptom=symptoms['pain'], symptom_frequency=0)
+    assert get_index().total_weights[flu.pk] == 5 + 1
+    assert get_index().total_weights == CatalogIndex.from_db().total_weights
+
+    flu.delete()
+    assert flu.pk not in get_index().total_weights
+
+
+@pytest.mark.django_db
+def test_index_is_rebuilt_after_a_change_by_another_process(catalog):
+    index = get_index()
+    assert get_index() is index
+
+    # Another process changed the catalog: the local index did not see the row.
+    DiseaseSymptom.objects.bulk_create([
+        DiseaseSymptom(disease=catalog['diseases']['bronchitis'], symptom=catalog['symptoms']['fever'], symptom_frequency=2)
+    ])
+    bump_version(CATALOG)
+    assert catalog['diseases']['bronchitis'].pk in get_index().filter(symptoms=[catalog['symptoms']['fever'].pk])
+
+    # A change made in this process is applied without a rebuild.
+    index = get_index()
+    catalog['diseases']['angina'].affected_organs.add(catalog['organs']['lungs'])
+    assert get_index() is index
+
+
+@pytest.mark.django_db
+def test_versions_are_not_evicted_with_the_cache():
+    version, = get_versions(CATALOG)
+    cache.clear()
+    assert get_versions(CATALOG) == (version,)
+    assert bump_version(CATALOG) == version + 1 and get_versions(CATALOG) == (version + 1,)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_changes_reach_indexes_and_versions_on_commit():
+    index = get_index()
+    version, = get_versions(CATALOG)
+    with pytest.raises(RuntimeError), transaction.atomic():
+        Disease.objects.create(name='Phantom', description='Rolled back')
+        raise RuntimeError
+    assert get_versions(CATALOG) == (version,) and not index.names
+
+    with transaction.atomic():
+        disease = Disease.objects.create(name='Cold', description='Common cold')
+        assert get_versions(CATALOG) == (version,)
+    assert get_versions(CATALOG) > (version,)
+    assert get_index() is index and index.names == {disease.pk: 'Cold'}
+
+
+@pytest.mark.django_db
+def test_clear_catalog_invalidates_cached_pages(client, catalog):
+    flu = catalog['diseases']['flu']
+    api_url = reverse('api_disease', args=[flu.pk])
+    assert client.get(api_url).status_code == 200
+    assert client.get(reverse('disease_details', args=[flu.pk])).status_code == 200
+
+    clear_catalog()
+    assert client.get(api_url).status_code == 404
+    assert client.get(reverse('disease_details', args=[flu.pk])).status_code == 404
+
+
+@pytest.mark.django_db
+def test_contact_message_is_queued_and_sent_by_worker(client, smtp_server):
+    response = client.post(reverse('contact_page'), {
+        'sender': 'Patient', 'sender_email': 'patient@example.com', 'message_text': 'Hello',
+    })
+    assert response.status_code == 302
+    assert smtp_server.messages == []
+    assert OutgoingEmail.objects.get().status == OutgoingEmail.PENDING
+
+    queue_mail('Second', 'Body', None, ['someone@example.com'])
+    assert send_queued_mail() == 2
+    assert smtp_server.connections == 1
+    assert [recipients for recipients, data in smtp_server.messages] == [['nikolska.work@gmail.com'], ['someone@example.com']]
+    assert set(OutgoingEmail.objects.values_list('status', flat=True)) == {OutgoingEmail.SENT}
+
+
+@pytest.mark.django_db
+def test_queued_mail_is_retried_with_backoff(settings):
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST, settings.EMAIL_PORT = '127.0.0.1', 9
+    email = queue_mail('Subject', 'Body', None, ['someone@example.com'])
+
+    assert send_queued_mail() == 0
+    email.refresh_from_db()
+    assert email.status == OutgoingEmail.PENDING
+    assert email.attempts == 1 and email.last_error
+    assert email.next_attempt_at > timezone.now()
+    assert send_queued_mail() == 0
+    email.refresh_from_db()
+    assert email.attempts == 1
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+def png_upload(name, width, height):
+    buffer = BytesIO()
+    Image.new('RGBA', (width, height), (200, 30, 30, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+@pytest.mark.django_db
+def test_organ_upload_creates_image_variants(client, media_root):
+    organ = Organ.objects.create(name='Heart', description='Heart', image=png_upload('heart.png', 1200, 600))
+    organ.refresh_from_db()
+    variants = json.loads(organ.image_variants)
+    assert variants['width'] == 1200
+    assert [width for width, name, webp_name in variants['sizes']] == [150, 200, 400]
+    assert Image.open(media_root / variants['sizes'][0][1]).size == (150, 75)
+    assert Image.open(media_root / variants['sizes'][0][2]).format == 'WEBP'
+
+    content = client.get(reverse('organs_list')).content.decode()
+    assert 'type="image/webp"' in content
+    assert f'{variants["sizes"][1][1].split("/")[-1]} 200w' in content
+
+
+@pytest.mark.django_db
+def test_make_image_variants_backfills_existing_images(media_root):
+    area = GeographicalArea.objects.create(area='Europe', image=png_upload('europe.png', 300, 300))
+    GeographicalArea.objects.filter(pk=area.pk).update(image_variants='')
+    call_command('make_image_variants', stdout=StringIO())
+    area.refresh_from_db()
+    assert [width for width, name, webp_name in json.loads(area.image_variants)['sizes']] == [150, 200]
+
+
+@pytest.mark.django_db
+def test_uploads_are_served_with_immutable_cache_headers(client, media_root):
+    organ = Organ.objects.create(name='Heart', description='Heart', image=png_upload('heart.png', 100, 100))
+    assert re.fullmatch(r'blobs/[0-9a-f]{2}/[0-9a-f]{64}\.png', organ.image.name)
+    content = (media_root / organ.image.name).read_bytes()
+
+    response = client.get(organ.image.url)
+    assert response.status_code == 200
+    assert b''.join(response.streaming_content) == content
+    assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response['Content-Type'] == 'image/png'
+
+    assert client.get(organ.image.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+
+    response = client.get(organ.image.url, HTTP_RANGE='bytes=10-19')
+    assert response.status_code == 206
+    assert response['Content-Range'] == f'bytes 10-19/{len(content)}'
+    assert b''.join(response.streaming_content) == content[10:20]
+
+    response = client.get(organ.image.url, HTTP_RANGE=f'bytes={len(content)}-')
+    assert response.status_code == 416
+
+
+@pytest.mark.django_db
+def test_media_view_rejects_paths_outside_media_root(client, media_root):
+    assert client.get('/media/../manage.py').status_code == 400
+    assert client.get('/media/organs/missing.png').status_code == 404
+
+
+@pytest.mark.django_db
+def test_identical_uploads_are_stored_once_and_collected_when_unused(media_root):
+    heart = Organ.objects.create(name='Heart', description='Heart', image=png_upload('heart.png', 300, 300))
+    copy = Organ.objects.create(name='Heart copy', description='Heart', image=png_upload('other.png', 300, 300))
+    assert heart.image.name == copy.image.name
+    assert StoredBlob.objects.get(name=heart.image.name).references == 2
+    blobs = set(StoredBlob.objects.values_list('name', flat=True))
+    assert len(blobs) == 5  # The image, two resized copies and their WebP versions.
+
+    heart.delete()
+    assert collect_garbage(grace=timedelta(0)) == []
+    # Storing the content again restarts the grace period of its blobs.
+    StoredBlob.objects.update(created_at=timezone.now() - timedelta(days=1))
+    Organ.objects.create(name='Heart again', description='Heart', image=png_upload('again.png', 300, 300)).delete()
+    StoredBlob.objects.update(references=0)
+    assert collect_garbage(grace=timedelta(hours=1)) == []
+    recount_references()
+    copy.image = png_upload('lungs.png', 100, 50)
+    copy.save()
+    assert StoredBlob.objects.get(name=copy.image.name).references == 1
+
+    StoredBlob.objects.update(references=7)
+    recount_references()
+    assert sorted(collect_garbage(grace=timedelta(0))) == sorted(blobs)
+    assert all(not (media_root / name).exists() for name in blobs)
+    assert list(StoredBlob.objects.values_list('name', flat=True)) == [copy.image.name]
+
+
+@pytest.mark.django_db
+def test_typeahead_matches_word_prefixes(client, catalog, django_assert_num_queries):
+    url = reverse('typeahead', args=['symptoms'])
+    assert client.get(url, {'q': 'PA'}).json()['results'] == [{'id': catalog['symptoms']['pain'].pk, 'name': 'Chest pain'}]
+    # Only the table version is read.
+    with django_assert_num_queries(1):
+        assert [row['name'] for row in client.get(url, {'q': 'c'}).json()['results']] == ['Chest pain', 'Cough']
+
+    Symptom.objects.create(name='Palpitations')
+    assert [row['name'] for row in client.get(url, {'q': 'pa'}).json()['results']] == ['Chest pain', 'Palpitations']
+    for limit in ('0', '-1'):
+        assert len(client.get(url, {'q': 'pa', 'limit': limit}).json()['results']) == 1
+    assert client.get(reverse('typeahead', args=['areas']), {'q': 'eu'}).json()['results'][0]['name'] == 'Europe'
+
+
+@pytest.mark.django_db
+def test_search_form_renders_only_selected_choices(catalog):
+    form = DiseaseSearchForm(data={'symptoms': [str(catalog['symptoms']['fever'].pk)]})
+    html = str(form['symptoms'])
+    assert 'Fever' in html and 'Cough' not in html
+    assert reverse('typeahead', args=['symptoms']) in html
+
+
+@pytest.mark.django_db
+def test_metrics_record_requests_by_url_name(client, catalog, settings, tmp_path):
+    settings.METRICS_DIR = str(tmp_path)
+    registry.reset()
+    client.get(reverse('disease_details', args=[catalog['diseases']['flu'].pk]))
+    client.get('/no-such-page/')
+    stats = registry.snapshot()['views']
+    details = stats['disease_details']
+    assert details['requests'] == {'GET 200': 1} and details['count'] == 1
+    assert details['db_queries'] > 0 and details['template_seconds'] > 0 and details['response_bytes'] > 0
+    assert stats['<unresolved>']['requests'] == {'GET 404': 1}
+
+    query = Query.parse(f's:{catalog["symptoms"]["cough"].pk}')
+    query_diseases(query)
+    query_diseases(query)
+    (tmp_path / '99999.json').write_text(json.dumps({
+        'views': {'disease_details': details}, 'search_cache': {'size': 1, 'max_size': 1000, 'misses': 1},
+    }))
+    response = client.get(reverse('metrics'))
+    text = response.content.decode()
+    assert 'medical_app_search_cache_lookups_total{result="hit"} 1' in text
+    assert 'medical_app_search_cache_lookups_total{result="miss"} 2' in text
+    assert 'medical_app_search_cache_entries 2' in text
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    assert 'medical_app_requests_total{view="disease_details",method="GET",status="200"} 2' in text
+    assert 'medical_app_request_duration_seconds_count{view="disease_details"} 2' in text
+    assert 'medical_app_request_duration_seconds_bucket{view="disease_details",le="+Inf"} 2' in text
+
+    settings.METRICS_TOKEN = 'secret'
+    assert client.get(reverse('metrics')).status_code == 404
+    assert client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret').status_code == 200
+
+
+def test_query_fingerprint():
+    sql = 'SELECT * FROM "t" WHERE "t"."id" IN (1, 2, 3) AND "t"."name" = \'it\'\'s\' LIMIT 21'
+    assert fingerprint(sql) == 'SELECT * FROM "t" WHERE "t"."id" IN (...) AND "t"."name" = ? LIMIT ?'
+
+
+@pytest.mark.django_db
+def test_query_recorder_finds_template_n_plus_one(catalog):
+    template = Template('{% for row in rows %}{{ row.symptom }}\n{% endfor %}')
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        template.render(Context({'rows': list(DiseaseSymptom.objects.all())}))
+    offenders = recorder.offenders('disease_details', threshold=2)
+
+    assert [(offender.kind, offender.location, offender.count) for offender in offenders] == [
+        ('repeated', '<unknown source>:1', 5),
+    ]
+    assert offenders[0].shape.startswith('SELECT "main_app_symptom"."id"')
+
+
+@pytest.mark.django_db
+def test_query_check_middleware_reports_in_header(client, catalog, settings):
+    settings.QUERYCHECK = True
+    response = client.get(reverse('disease_details', args=[catalog['diseases']['flu'].pk]))
+    assert re.match(r'^queries=\d+; repeated=0; duplicate=0$', response['X-Query-Check'])
+
+
+@pytest.mark.django_db
+def test_explain_queries_finds_no_scans_or_sorts():
+    out = StringIO()
+    call_command('explain_queries', diseases=500, symptoms=200, fail=True, stdout=out)
+    lines = out.getvalue().splitlines()
+    assert 'symptoms_list: later page: ok' in lines
+    assert 'disease_details: symptoms by frequency: ok' in lines
+    assert not Disease.objects.exists()
+
+
+@pytest.mark.django_db
+def test_symptom_names_are_unique(catalog):
+    form = SymptomCreateForm({'name': 'Cough'})
+    assert not form.is_valid() and 'name' in form.errors
+
+
+@pytest.mark.django_db
+def test_cards_are_dropped_before_versions_are_bumped(catalog, monkeypatch):
+    rebuild_cards()
+    calls = []
+    drop_cards, bump_versions = signals.drop_cards, signals.bump_versions
+    monkeypatch.setattr(signals, 'drop_cards', lambda pks: calls.append(('drop', sorted(pks))) or drop_cards(pks))
+    monkeypatch.setattr(signals, 'bump_versions', lambda *names: calls.append('bump') or bump_versions(*names))
+    flu, bronchitis = catalog['diseases']['flu'], catalog['diseases']['bronchitis']
+
+    catalog['symptoms']['cough'].save()
+    assert calls == [('drop', sorted([flu.pk, bronchitis.pk])), 'bump']
+
+    rebuild_cards()
+    calls.clear()
+    catalog['treatments']['rest'].delete()
+    assert calls == [('drop', sorted([flu.pk, bronchitis.pk])), 'bump']
+
+
+@pytest.mark.django_db
+def test_reading_cards_writes_no_version_counters(catalog):
+    rebuild_cards()
+    counters = Version.objects.count()
+    assert len(sum(card_chunks(), [])) == 3
+    assert Version.objects.count() == counters
+
+    unchanged = Disease.objects.create(name='Unchanged', description='')
+    Version.objects.filter(name=disease_version_name(unchanged.pk)).delete()
+    generation, = get_versions(GENERATION)
+    assert get_versions(disease_version_name(unchanged.pk)) == (generation,)
+    assert bump_version(disease_version_name(unchanged.pk)) == generation + 1
+
+
+@pytest.mark.django_db
+def test_disease_cards_follow_related_changes(catalog, django_assert_num_queries):
+    flu = catalog['diseases']['flu']
+    assert rebuild_cards() == 3
+    # The versions and the card.
+    with django_assert_num_queries(2):
+        card = get_card(flu.pk)
+    assert [(row['name'], row['frequency']) for row in card['symptoms']] == [('Fever', 5), ('Cough', 3)]
+    assert get_card(0) is None
+
+    catalog['symptoms']['cough'].name = 'Dry cough'
+    catalog['symptoms']['cough'].save()
+    assert not DiseaseCard.objects.filter(pk=flu.pk).exists()
+    assert get_card(flu.pk)['symptoms'][1]['name'] == 'Dry cough'
+
+    catalog['areas']['asia'].delete()
+    flu.affected_organs.clear()
+    card = get_card(flu.pk)
+    assert card['geographical_area'] == [{'id': catalog['areas']['europe'].pk, 'area': 'Europe'}]
+    assert card['affected_organs'] == []
+
+    flu.delete()
+    assert not DiseaseCard.objects.filter(pk=flu.pk).exists()
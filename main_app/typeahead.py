@@ -0,0 +1,70 @@
+import re
+from bisect import bisect_left
+
+from .models import GeographicalArea, Organ, Symptom
+from .versioning import ProcessCache, table_version_name
+
+
+# Typeahead kinds: model and the field holding the name.
+SOURCES = {
+    'symptoms': (Symptom, 'name'),
+    'organs': (Organ, 'name'),
+    'areas': (GeographicalArea, 'area'),
+}
+WORD_START_RE = re.compile(r'(?:^|(?<=[\s\-(/,]))\w', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted keys for prefix lookups with bisect.
+
+    Every word of a name starts a key, so ``pain`` finds "Chest pain" as
+    well as "Pain in the joints".
+    """
+
+    def __init__(self, rows=()):
+        entries = []
+        for pk, name in rows:
+            text = normalize(name)
+            for match in WORD_START_RE.finditer(text):
+                entries.append((text[match.start():], name, pk))
+        entries.sort()
+        self.keys = [key for key, name, pk in entries]
+        self.entries = [(pk, name) for key, name, pk in entries]
+
+    def complete(self, prefix, limit=10):
+        """Return up to ``limit`` (pk, name) pairs with a word starting with ``prefix``."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        for position in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[position].startswith(prefix):
+                break
+            pk, name = self.entries[position]
+            if pk not in seen:
+                seen.add(pk)
+                results.append((pk, name))
+                if len(results) == limit:
+                    break
+        return results
+
+
+def build_prefix_index(kind):
+    model, field = SOURCES[kind]
+    return PrefixIndex(model.objects.values_list('pk', field).iterator())
+
+
+_indexes = ProcessCache(lambda kind: (table_version_name(SOURCES[kind][0]),), build_prefix_index)
+
+
+def get_prefix_index(kind):
+    """Return the process-wide index of a kind, rebuilt after its table changed."""
+    return _indexes.get(kind)
+
+
+def reset_prefix_indexes():
+    _indexes.clear()
@@ -0,0 +1,185 @@
+"""Version counters for cache keys, kept in the ``Version`` table.
+
+Every cached value derived from the catalog is stored under a key built
+from the versions it depends on, so bumping a version invalidates all of
+those keys at once without deleting anything. Counters exist per object
+(``object_version_name``), per table (``table_version_name``), for any
+change of the catalog (``CATALOG``) and for bulk writes that bypass model
+signals (``GENERATION``, part of every catalog key). The counters live in
+the database rather than the cache, which may evict them. A counter gets
+its row when it is first bumped and reads as ``GENERATION`` until then, so
+reading the versions of every disease writes nothing.
+
+``ProcessCache`` keeps values such as the search indexes in process memory
+and rebuilds them when the versions they were built from change.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Disease, Version
+
+
+# Bumped by any change of a catalog model.
+CATALOG = 'catalog'
+# Bumped by bulk writes which send no signals; part of every catalog key.
+GENERATION = 'generation'
+
+# Counters read during the current request of the thread, see remember_versions.
+_local = threading.local()
+
+
+def _initial_version():
+    # The generation counter created again, after its table was emptied,
+    # starts from a value it never had, so cached keys built from its old
+    # values are not reused.
+    return int(time.time() * 1000)
+
+
+def _fetch(names):
+    rows = Version.objects.filter(name__in=names).values_list('name', 'value', 'modified')
+    return {name: (value, modified) for name, value, modified in rows}
+
+
+def _rows(names):
+    """Return (value, modified) of the counters of the given names by name.
+
+    A counter without a row reads as the generation counter; only the
+    generation counter is created here.
+    """
+    rows = getattr(_local, 'rows', None)
+    rows = {} if rows is None else rows
+    wanted = [name for name in dict.fromkeys((GENERATION, *names)) if name not in rows]
+    if wanted:
+        rows.update(_fetch(wanted))
+        if GENERATION not in rows:
+            generation, created = Version.objects.get_or_create(
+                name=GENERATION, defaults={'value': _initial_version(), 'modified': time.time()}
+            )
+            rows[GENERATION] = (generation.value, generation.modified)
+        rows.update((name, rows[GENERATION]) for name in wanted if name not in rows)
+    return rows
+
+
+def remember_versions(**kwargs):
+    """Read every counter once until ``forget_versions``.
+
+    Connected to the start of every request, so a request reads its
+    versions with one query per set of names and sees one snapshot of them.
+    """
+    _local.rows = {}
+
+
+def forget_versions(**kwargs):
+    _local.rows = None
+
+
+def get_versions(*names):
+    """Return the current version numbers of the given names as a tuple."""
+    rows = _rows(names)
+    return tuple(rows[name][0] for name in names)
+
+
+def bump_versions(*names):
+    """Increase the versions of the given names and return the new versions as a tuple."""
+    now = time.time()
+    counters = Version.objects.filter(name__in=names)
+    with transaction.atomic():
+        if counters.update(value=F('value') + 1, modified=now) < len(set(names)):
+            # A counter bumped for the first time goes on from the generation it read as.
+            existing = set(counters.values_list('name', flat=True))
+            missing = [name for name in dict.fromkeys(names) if name not in existing]
+            generation = _rows([GENERATION])[GENERATION][0]
+            Version.objects.bulk_create([
+                Version(name=name, value=generation, modified=now) for name in missing
+            ], ignore_conflicts=True)
+            Version.objects.filter(name__in=missing).update(value=F('value') + 1, modified=now)
+        bumped = dict(counters.values_list('name', 'value'))
+    rows = getattr(_local, 'rows', None)
+    if rows is not None:
+        rows.update((name, (value, now)) for name, value in bumped.items())
+    return tuple(bumped[name] for name in names)
+
+
+def bump_version(name):
+    """Increase the version of a name and return the new version."""
+    return bump_versions(name)[0]
+
+
+def get_last_modified(*names):
+    """Return when any of the given names was last bumped, as a datetime."""
+    rows = _rows(names)
+    return datetime.fromtimestamp(max(rows[name][1] for name in names), timezone.utc)
+
+
+def object_version_name(model, pk):
+    return f'{model._meta.label_lower}:{pk}'
+
+
+def table_version_name(model):
+    return f'table:{model._meta.label_lower}'
+
+
+def disease_version_name(pk):
+    return object_version_name(Disease, pk)
+
+
+def versioned_key(prefix, names, *parts):
+    """Return a cache key which changes whenever one of the named versions does."""
+    return ':'.join(str(part) for part in (prefix, *parts, *get_versions(*names)))
+
+
+def catalog_key(prefix, names, *parts):
+    """Return a versioned key for data derived from the catalog."""
+    return versioned_key(prefix, (GENERATION, *names), *parts)
+
+
+def bump_generation(models):
+    """Invalidate everything derived from the catalog after a bulk write."""
+    return bump_versions(GENERATION, *(table_version_name(model) for model in models), CATALOG)[-1]
+
+
+class ProcessCache:
+    """Values built from the database and kept in process memory by key.
+
+    Every value is stored with the versions of ``names(key)`` read before
+    it was built by ``build(key)``, or the ``build`` given to ``get``.
+    Once one of them changes, which may be the doing of another process,
+    the next ``get`` builds it again. A change made by this process can be
+    applied to a built value in place with ``update`` and then recorded
+    with ``advance``, saving the rebuild.
+    """
+
+    def __init__(self, names, build=None):
+        self.names, self.build = names, build
+        self.values = {}
+        self.lock = threading.RLock()
+
+    def get(self, key=None, build=None):
+        versions = get_versions(*self.names(key))
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None or entry[0] != versions:
+                entry = self.values[key] = (versions, (build or self.build)(key))
+            return entry[1]
+
+    def update(self, func, *args, key=None):
+        """Call ``func(value, *args)`` if the value has been built already."""
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None:
+                func(entry[1], *args)
+
+    def advance(self, version, key=None):
+        """Record that a value depending on one name holds the change which produced ``version``."""
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is not None and entry[0] == (version - 1,):
+                self.values[key] = ((version,), entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
@@ -1,22 +1,40 @@
+import hashlib
+
 from formtools.wizard.views import SessionWizardView
 
 from django.contrib import messages
-from django.contrib.auth.mixins import PermissionRequiredMixin, UserPassesTestMixin
+from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.auth.models import Group, Permission
 from django.contrib.auth.views import PasswordChangeView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core.mail import mail_admins, send_mail
-from django.http import HttpResponseRedirect, Http404
-from django.shortcuts import get_object_or_404, render
+from django.core.cache import cache
+from django.http import HttpResponsePermanentRedirect, HttpResponseRedirect, Http404, StreamingHttpResponse
+from django.shortcuts import render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
-from django.views.generic import CreateView, DetailView, FormView, ListView, TemplateView, UpdateView
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
+from django.views.decorators.http import condition
+from django.views.generic import CreateView, DetailView, FormView, ListView, TemplateView, UpdateView, View
 
+from .authorization import DoctorsRequiredMixin
+from .cards import get_card
 from .forms import (
     ContactForm, DiseaseCreateForm, DiseaseFormSet, DiseaseSearchForm, 
     GeographicalAreaCreateForm, OrganCreateForm, SymptomCreateForm, 
     TreatmentsCreateForm, UserCreateForm, UserUpdateForm
 )
+from .export import export_ndjson
+from .fulltext import search_diseases
+from .mailqueue import queue_mail, queue_mail_admins
 from .models import Disease, DiseaseSymptom, GeographicalArea, Organ, Symptom, Treatment, User
+from .pagination import KeysetPaginationMixin
+from .query import Query, QuerySyntaxError
+from .search import normalize_ids, query_diseases
+from .versioning import (
+    CATALOG, GENERATION, catalog_key, disease_version_name, get_last_modified, get_versions
+)
+from .writers import create_disease
 from medical_app.settings import EMAIL_HOST_USER
 
 
@@ -47,57 +65,37 @@ class ContactView(FormView):
 
         subject = f'Message from {sender}, {sender_email}'
         
-        mail_admins(subject, message, fail_silently=False)
+        queue_mail_admins(subject, message)
         
         messages.success(self.request, 'Your message successfully sent!')
 
         return HttpResponseRedirect(self.get_success_url())
 
 
-class DiseaseCreateView(SuccessMessageMixin, UserPassesTestMixin, SessionWizardView):
+class DiseaseCreateView(SuccessMessageMixin, DoctorsRequiredMixin, SessionWizardView):
     """Create new disease"""
 
     template_name = "add_new_disease.html"
     form_list = [DiseaseCreateForm, DiseaseFormSet]
 
-    def process_form_data(self, form_list):
-        for form in form_list:
-            if form.is_valid():
-                form_data = self.get_all_cleaned_data()
-                formset = form_data['formset-1']
-                
-                disease = Disease.objects.create(
-                    name=form_data['name'],
-                    description=form_data['description']
-                )
-
-                disease.affected_organs.set(form_data['affected_organs'])
-                disease.geographical_area.set(form_data['geographical_area'])
-                disease.treatment.set(form_data['treatment'])
-                disease.save()
-
-                for i in range(len(formset)):
-                    try: 
-                        symptom = Symptom.objects.get(name=formset[i]['symptom'])
-                        DiseaseSymptom.objects.create(
-                            disease=disease,
-                            symptom=symptom,
-                            symptom_frequency=formset[i]['symptom_frequency']
-                        )
-                    except KeyError:
-                        return form_data
-
-                return form_data
-
     def done(self, form_list, **kwargs):
-        if self.request.method == 'POST':
-            self.process_form_data(form_list)
-            disease = self.process_form_data(form_list)['name']
-            messages.success(self.request, f'New disease {disease} successfully created!')
+        """Create the disease with its symptoms in one transaction."""
+        disease_form, formset = form_list
+        data = disease_form.cleaned_data
+        symptoms = [
+            (row['symptom'], row['symptom_frequency'])
+            for row in formset.cleaned_data if row.get('symptom')
+        ]
+        disease = create_disease(
+            name=data['name'],
+            description=data['description'],
+            affected_organs=data['affected_organs'],
+            geographical_area=data['geographical_area'],
+            treatment=data['treatment'],
+            symptoms=symptoms
+        )
+        messages.success(self.request, f'New disease {disease.name} successfully created!')
         return HttpResponseRedirect(reverse('diseases_list'))
-    
-    def test_func(self):
-        return self.request.user.groups.filter(name='Doctors').exists() or self.request.user.is_superuser
 
 
 class DiseaseDetailsView(DetailView):
@@ -105,57 +103,143 @@ class DiseaseDetailsView(DetailView):
 
     model = Disease
     template_name = 'disease_details.html'
-
-    def get_context_data(self, **kwargs):
-        """Insert the form into the context dict"""
-
-        disease = get_object_or_404(Disease, pk=self.kwargs['pk'])
-        symptoms_details = DiseaseSymptom.objects.filter(disease=disease).order_by('-symptom_frequency')
-        ctx = super().get_context_data(**kwargs)
-        ctx["symptoms_details"] = symptoms_details
-        return ctx
-
-
-class DiseasesListView(ListView):
-    """ Page with all disease from DB. """
+    body_template_name = 'disease_details_body.html'
+    cache_timeout = 60 * 60 * 24
+
+    def get(self, request, *args, **kwargs):
+        """Render the page around the cached details of the disease."""
+
+        pk = self.kwargs['pk']
+        key = catalog_key('disease_details', [disease_version_name(pk), 'references'], pk)
+        details = cache.get(key)
+        if details is None:
+            card = get_card(pk)
+            if card is None:
+                raise Http404('No disease found')
+            frequencies = dict(DiseaseSymptom.SYMPTOM_FREQUENCY_CHOICES)
+            body = render_to_string(self.body_template_name, {
+                'disease': card,
+                'symptoms_details': [
+                    {'symptom': row['name'], 'frequency': frequencies[row['frequency']]} for row in card['symptoms']
+                ],
+            })
+            details = {'name': card['name'], 'body': body}
+            cache.set(key, details, self.cache_timeout)
+        return self.render_to_response(details)
+
+
+class DiseasesExportView(View):
+    """ The whole catalog as NDJSON, one disease with its relations per line. """
+
+    def get(self, request, *args, **kwargs):
+        """Stream the catalog chunk by chunk."""
+        response = StreamingHttpResponse(export_ndjson(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="diseases.ndjson"'
+        return response
+
+
+class DiseasesListView(KeysetPaginationMixin, ListView):
+    """ Page with all disease from DB or with diseases found by a text query. """
 
     model = Disease
     context_object_name = 'diseases'
     template_name = 'diseases_list.html'
+    search_paginate_by = 50
+
+    def get_queryset(self):
+        """Return diseases matching the `q` parameter by relevance, if given."""
+        self.query = self.request.GET.get('q', '').strip()
+        if self.query:
+            return search_diseases(self.query)
+        return super().get_queryset()
+
+    def get_paginate_by(self, queryset):
+        return self.search_paginate_by if self.query else self.paginate_by
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx['query'] = self.query
+        return ctx
 
 
 class DiseaseSearchView(FormView):
-    """ Searching for disease by symptoms and affected organs. """
+    """ Searching for disease by symptoms and affected organs.
+
+    Results live at ``?q=<query>`` in the syntax of main_app/query.py. A
+    query which is not in its canonical form, or the search form's fields,
+    are redirected to the canonical URL, so equivalent searches share one
+    URL. Result pages are answered with cache headers and conditional
+    responses built from the catalog version; pages of signed-in users are
+    private.
+    """
 
     model = Disease
     template_name = 'search_disease.html'
     form_class = DiseaseSearchForm
+    filter_fields = ('symptoms', 'affected_organs', 'geographical_area', 'min_frequency')
+
+    results_limit = 100
+    max_age = 60 * 5
+
+    def get(self, request, *args, **kwargs):
+        """Render the form, redirect to the canonical query or render its results."""
+
+        if 'q' not in request.GET:
+            if any(field in request.GET for field in self.filter_fields):
+                return self.redirect_to(self.filters_query(request.GET))
+            return super().get(request, *args, **kwargs)
+
+        try:
+            query = Query.parse(request.GET['q'])
+        except QuerySyntaxError as error:
+            ctx = self.get_context_data(query_error=f'Invalid query: {error}')
+            return self.render_to_response(ctx, status=400)
+        if str(query) != request.GET['q'] or len(request.GET) > 1:
+            return self.redirect_to(query)
+
+        versions = get_versions(GENERATION, CATALOG)
+        etag = hashlib.sha1(repr((versions, str(query), request.user.pk)).encode()).hexdigest()
+        view = condition(
+            etag_func=lambda request, query: etag,
+            last_modified_func=lambda request, query: get_last_modified(GENERATION, CATALOG),
+        )(self.render_results)
+        response = view(request, query)
+        # Pages of signed-in users show their navigation, so only their browser may keep them.
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=self.max_age)
+        else:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        patch_vary_headers(response, ['Cookie'])
+        return response
 
     def post(self, request, *args, **kwargs):
-        """Filter DB to search objects and redirect URL with found diseases."""
-
-        symptoms = request.POST.getlist('symptoms')
-        organs = request.POST.getlist('affected_organs')
-        geographical_area = request.POST.getlist('geographical_area')
-        # all_world = True if request.POST.get('all_areas') == 'on' else False
-        # all_areas_form_db = GeographicalArea.objects.all()
-        # all_areas = [item.pk for item in all_areas_form_db] 
-
-        diseases = Disease.objects.all()
-        diseases = diseases.filter(affected_organs__in=organs).distinct() if organs else diseases
-        diseases = diseases.filter(symptoms__in=symptoms).distinct() if symptoms else diseases
-        # diseases = diseases.filter(geographical_area__in=all_areas) if all_world else diseases
-        diseases = diseases.filter(geographical_area__in=geographical_area).distinct() if geographical_area else diseases
-
-        ctx = {'diseases': diseases}
+        """Rank diseases by the chosen symptoms and render the best matches."""
+        return self.render_results(request, self.filters_query(request.POST))
+
+    def filters_query(self, data):
+        """Return the Query of the search form's fields."""
+        min_frequency = data.get('min_frequency', '')
+        return Query.from_filters(
+            normalize_ids(data.getlist('symptoms')),
+            normalize_ids(data.getlist('affected_organs')),
+            normalize_ids(data.getlist('geographical_area')),
+            int(min_frequency) if min_frequency.isdigit() else None,
+        )
+
+    def redirect_to(self, query):
+        return HttpResponsePermanentRedirect(f"{reverse('search_disease')}?{urlencode({'q': str(query)})}")
+
+    def render_results(self, request, query):
+        diseases = query_diseases(query, limit=self.results_limit)
+
+        ctx = {'diseases': diseases, 'search_query': str(query)}
         return render(request, 'diseases_list.html', ctx)
 
 
-class GeographicalAreaListView(SuccessMessageMixin, CreateView, ListView):
+class GeographicalAreaListView(KeysetPaginationMixin, SuccessMessageMixin, CreateView, ListView):
     """ Page with all geographical areas from DB. """
 
     model = GeographicalArea
-    object_list = GeographicalArea.objects.all()
     form_class = GeographicalAreaCreateForm
     context_object_name = 'areas'
     template_name = 'geographical_areas_list.html'
@@ -169,7 +253,7 @@ class HomePageView(TemplateView):
     template_name = 'home_page.html'
 
 
-class OrgansListView(ListView):
+class OrgansListView(KeysetPaginationMixin, ListView):
     """ Page with organs list from DB. """
 
     model = Organ
@@ -177,7 +261,7 @@ class OrgansListView(ListView):
     template_name = 'organs_list.html'
 
 
-class OrganCreateView(SuccessMessageMixin, UserPassesTestMixin, CreateView):
+class OrganCreateView(SuccessMessageMixin, DoctorsRequiredMixin, CreateView):
     """ Adding new organ to DB. """
     model = Organ
     form_class = OrganCreateForm
@@ -185,9 +269,6 @@ class OrganCreateView(SuccessMessageMixin, UserPassesTestMixin, CreateView):
     success_message = 'New organ %(name)s successfully created!'
     success_url = reverse_lazy('organs_list')
 
-    def test_func(self):
-        return self.request.user.groups.filter(name='Doctors').exists() or self.request.user.is_superuser
-
 
 class RegistrationView(FormView):
     """ Registration page. """
@@ -235,22 +316,21 @@ class RegistrationView(FormView):
             Let's start http://medical-reference-book.herokuapp.com/
         '''
         recepient = str(form['email'].value())
-        send_mail(
+        queue_mail(
             subject, 
             message, 
             EMAIL_HOST_USER, 
-            [recepient], 
-            fail_silently = False
+            [recepient]
         )
 
         return HttpResponseRedirect(self.get_success_url())
 
 
-class SymptomsListView(SuccessMessageMixin, CreateView, ListView):
+class SymptomsListView(KeysetPaginationMixin, SuccessMessageMixin, CreateView, ListView):
     """ Page with all symptoms from DB. """
 
     model = Symptom
-    object_list = Symptom.objects.all()
+    queryset = Symptom.objects.select_related('affected_organ')
     form_class = SymptomCreateForm
     context_object_name = 'symptoms'
     template_name = 'symptoms_list.html'
@@ -258,11 +338,10 @@ class SymptomsListView(SuccessMessageMixin, CreateView, ListView):
     success_url = reverse_lazy('symptoms_list')
 
 
-class TreatmentsListView(SuccessMessageMixin, CreateView, ListView):
+class TreatmentsListView(KeysetPaginationMixin, SuccessMessageMixin, CreateView, ListView):
     """ Page with all treatments from DB. """
 
     model = Treatment
-    object_list = Treatment.objects.all()
     form_class = TreatmentsCreateForm
     context_object_name = 'treatments'
     template_name = 'treatments_list.html'
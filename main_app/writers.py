@@ -0,0 +1,122 @@
+from django.db import connection, transaction
+
+from .models import Disease, DiseaseSymptom, Symptom
+from .signals import disease_written
+
+
+def _pk(obj):
+    return getattr(obj, 'pk', obj)
+
+
+def resolve_symptoms(symptoms):
+    """Return symptom ids for Symptom objects, primary keys or names.
+
+    All names are looked up with a single query; an unknown name raises
+    Symptom.DoesNotExist.
+    """
+    names = {symptom for symptom in symptoms if isinstance(symptom, str)}
+    found = dict(Symptom.objects.filter(name__in=names).values_list('name', 'pk')) if names else {}
+    missing = names - found.keys()
+    if missing:
+        raise Symptom.DoesNotExist(f'Unknown symptoms: {", ".join(sorted(missing))}')
+    return [found[symptom] if isinstance(symptom, str) else _pk(symptom) for symptom in symptoms]
+
+
+def _symptom_frequencies(symptoms):
+    """Return {symptom_id: frequency} for (symptom, frequency) pairs."""
+    symptoms = list(symptoms)
+    ids = resolve_symptoms([symptom for symptom, frequency in symptoms])
+    return {pk: frequency for pk, (symptom, frequency) in zip(ids, symptoms)}
+
+
+def _insert_diseases(entries):
+    diseases = [Disease(name=entry['name'], description=entry.get('description', '')) for entry in entries]
+    if connection.features.can_return_ids_from_bulk_insert:
+        return Disease.objects.bulk_create(diseases)
+    for disease in diseases:
+        disease.save()
+    return diseases
+
+
+def create_diseases(entries):
+    """Create diseases with all their relations in one transaction.
+
+    Every entry is a dict with ``name`` and ``description`` and optional
+    ``affected_organs``, ``geographical_area`` and ``treatment`` (objects or
+    primary keys) and ``symptoms``, a list of (symptom, frequency) pairs
+    where symptom is a Symptom, its primary key or its name. Relations of
+    the whole batch are written with one bulk insert per table.
+    """
+    entries = list(entries)
+    with transaction.atomic():
+        names = [symptom for entry in entries for symptom, frequency in entry.get('symptoms', ())]
+        found = iter(resolve_symptoms(names))
+        frequencies = [
+            {next(found): frequency for symptom, frequency in entry.get('symptoms', ())}
+            for entry in entries
+        ]
+
+        diseases = _insert_diseases(entries)
+        rows = {model: [] for model in (
+            DiseaseSymptom, Disease.affected_organs.through,
+            Disease.geographical_area.through, Disease.treatment.through,
+        )}
+        for disease, entry, symptoms in zip(diseases, entries, frequencies):
+            rows[DiseaseSymptom] += [
+                DiseaseSymptom(disease=disease, symptom_id=pk, symptom_frequency=frequency)
+                for pk, frequency in symptoms.items()
+            ]
+            rows[Disease.affected_organs.through] += [
+                Disease.affected_organs.through(disease=disease, organ_id=_pk(organ))
+                for organ in set(entry.get('affected_organs', ()))
+            ]
+            rows[Disease.geographical_area.through] += [
+                Disease.geographical_area.through(disease=disease, geographicalarea_id=_pk(area))
+                for area in set(entry.get('geographical_area', ()))
+            ]
+            rows[Disease.treatment.through] += [
+                Disease.treatment.through(disease=disease, treatment_id=_pk(treatment))
+                for treatment in set(entry.get('treatment', ()))
+            ]
+        for model, objects in rows.items():
+            if objects:
+                model.objects.bulk_create(objects)
+
+    for disease, entry, symptoms in zip(diseases, entries, frequencies):
+        disease_written.send(
+            sender=Disease,
+            disease=disease,
+            symptoms=symptoms,
+            organs={_pk(organ) for organ in entry.get('affected_organs', ())},
+            areas={_pk(area) for area in entry.get('geographical_area', ())},
+        )
+    return diseases
+
+
+def create_disease(name, description, affected_organs=(), geographical_area=(), treatment=(), symptoms=()):
+    """Create one disease with its relations, see create_diseases."""
+    return create_diseases([{
+        'name': name,
+        'description': description,
+        'affected_organs': affected_organs,
+        'geographical_area': geographical_area,
+        'treatment': treatment,
+        'symptoms': symptoms,
+    }])[0]
+
+
+def set_disease_symptoms(disease, symptoms):
+    """Replace the symptom rows of a disease with (symptom, frequency) pairs."""
+    frequencies = _symptom_frequencies(symptoms)
+    with transaction.atomic():
+        # A plain DELETE: per-row post_delete signals are replaced by disease_written.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(DiseaseSymptom._meta.db_table)} WHERE disease_id = %s',
+                [disease.pk]
+            )
+        DiseaseSymptom.objects.bulk_create(
+            DiseaseSymptom(disease=disease, symptom_id=pk, symptom_frequency=frequency)
+            for pk, frequency in frequencies.items()
+        )
+    disease_written.send(sender=Disease, disease=disease, symptoms=frequencies)
@@ -52,6 +52,8 @@ LOGOUT_REDIRECT_URL = 'home_page'
 
 
 MIDDLEWARE = [
+    'main_app.metrics.MetricsMiddleware',
+    'main_app.querycheck.QueryCheckMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -94,6 +96,50 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Cached pages, cards and search results are shared by all processes: web
+# workers, the mail worker and management commands such as import_catalog.
+# The default is the database cache; run ``manage.py createcachetable``
+# once, or set CACHE_BACKEND and CACHE_LOCATION to another shared cache such
+# as memcached. The version counters of main_app/versioning.py which key
+# those entries are kept in the database, as the cache may evict them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'medical_app_cache'),
+    }
+}
+if not CACHES['default']['BACKEND'].startswith('django.core.cache.backends.memcached'):
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
+# Ranked disease searches are kept in a per-process LRU cache of
+# SEARCH_CACHE_SIZE entries; set SEARCH_CACHE_BACKEND to a cache alias to
+# share them between processes too. The hit and miss counters of the cache
+# are served at /metrics.
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 1000))
+SEARCH_CACHE_BACKEND = os.environ.get('SEARCH_CACHE_BACKEND') or None
+
+
+# Request metrics served at /metrics (main_app/metrics.py). Workers add
+# their totals to files in METRICS_DIR, which gunicorn.conf.py sets up. The
+# endpoint requires METRICS_TOKEN as a bearer token if it is set, otherwise
+# it is open to staff users and METRICS_ALLOWED_IPS.
+
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+
+# N+1 and duplicate query detector (main_app/querycheck.py), off unless
+# QUERYCHECK is set. A query shape run more than QUERYCHECK_THRESHOLD times
+# from one place in a request is reported.
+
+QUERYCHECK = bool(os.environ.get('QUERYCHECK'))
+QUERYCHECK_THRESHOLD = int(os.environ.get('QUERYCHECK_THRESHOLD', 5))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -122,6 +168,7 @@ EMAIL_HOST_PASSWORD = 'oqlisdbsdzddnlns'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_USE_SSL = False
+EMAIL_TIMEOUT = 30
 SERVER_EMAIL = EMAIL_HOST_USER
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
@@ -149,6 +196,10 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploaded files are stored once per content under a name derived from it
+# and served by main_app.mediafiles.serve_media with far-future cache headers.
+DEFAULT_FILE_STORAGE = 'main_app.storage.ContentAddressedStorage'
+
 
 # Extra places for collectstatic to find static files.
 
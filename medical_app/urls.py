@@ -14,36 +14,60 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.auth.views import LoginView, LogoutView
-from django.urls import path, re_path
+from django.urls import path, re_path, register_converter
 
+from main_app.api import (
+    DiseaseApiDetailView, DiseaseApiListView, GeographicalAreaApiDetailView,
+    GeographicalAreaApiListView, OrganApiDetailView, OrganApiListView,
+    SymptomApiDetailView, SymptomApiListView, TreatmentApiDetailView, TreatmentApiListView,
+    TypeaheadView
+)
+from main_app.converters import BigIntConverter
+from main_app.mediafiles import serve_media
+from main_app.metrics import metrics_view
 from main_app.views import (
     AuthorizationView, ContactView, DiseaseCreateView, DiseaseDetailsView,
-    DiseasesListView, DiseaseSearchView, GeographicalAreaListView,
+    DiseasesExportView, DiseasesListView, DiseaseSearchView, GeographicalAreaListView,
     HomePageView, OrganCreateView, OrgansListView, RegistrationView,
     SymptomsListView, TreatmentsListView, UserDataUpdateView, UserPasswordUpdateView
 )
 
 
+register_converter(BigIntConverter, 'bigint')
+
 urlpatterns = [
     path('', HomePageView.as_view(), name='home_page'),
     path('admin/', admin.site.urls, name='admin'),
+    path('api/diseases/', DiseaseApiListView.as_view(), name='api_diseases'),
+    path('api/diseases/<bigint:pk>/', DiseaseApiDetailView.as_view(), name='api_disease'),
+    path('api/geographical-areas/', GeographicalAreaApiListView.as_view(), name='api_geographical_areas'),
+    path('api/geographical-areas/<bigint:pk>/', GeographicalAreaApiDetailView.as_view(), name='api_geographical_area'),
+    path('api/organs/', OrganApiListView.as_view(), name='api_organs'),
+    path('api/organs/<bigint:pk>/', OrganApiDetailView.as_view(), name='api_organ'),
+    path('api/symptoms/', SymptomApiListView.as_view(), name='api_symptoms'),
+    path('api/symptoms/<bigint:pk>/', SymptomApiDetailView.as_view(), name='api_symptom'),
+    path('api/treatments/', TreatmentApiListView.as_view(), name='api_treatments'),
+    path('api/treatments/<bigint:pk>/', TreatmentApiDetailView.as_view(), name='api_treatment'),
+    re_path(r'^api/typeahead/(?P<kind>symptoms|organs|areas)/$', TypeaheadView.as_view(), name='typeahead'),
     path('authorization/', AuthorizationView.as_view(), name='authorization'),
     path('contact-us/', ContactView.as_view(), name='contact_page'),
-    re_path(r'^data-change/(?P<pk>\d+)/$', UserDataUpdateView.as_view(), name='change_data'),
+    path('data-change/<bigint:pk>/', UserDataUpdateView.as_view(), name='change_data'),
     path('diseases/', DiseasesListView.as_view(), name='diseases_list'),
-    re_path(r'^diseases/(?P<pk>\d+)/$', DiseaseDetailsView.as_view(), name='disease_details'),
+    path('diseases/<bigint:pk>/', DiseaseDetailsView.as_view(), name='disease_details'),
+    path('diseases/export/', DiseasesExportView.as_view(), name='diseases_export'),
     path('diseases/add/', DiseaseCreateView.as_view(), name='add_disease'),
     path('diseases/search/', DiseaseSearchView.as_view(), name='search_disease'),
     path('geographical-areas/', GeographicalAreaListView.as_view(), name='geographical_areas_list'),
     path('login/', LoginView.as_view(template_name='log_in.html'), name='log_in'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('metrics', metrics_view, name='metrics'),
     path('organs/', OrgansListView.as_view(), name='organs_list'),
     path('organs/add/', OrganCreateView.as_view(), name='add_organ'),
-    re_path(r'^password-change/(?P<pk>\d+)/$', UserPasswordUpdateView.as_view(), name='change_password'),
+    path('password-change/<bigint:pk>/', UserPasswordUpdateView.as_view(), name='change_password'),
     path('registration/', RegistrationView.as_view(), name='registration'),
     path('symptoms/', SymptomsListView.as_view(), name='symptoms_list'),
     path('treatments/', TreatmentsListView.as_view(), name='treatments_list'),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(r'^{}(?P<path>.+)$'.format(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
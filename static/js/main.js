@@ -1,12 +1,3 @@
-$(document).ready(function(){
-  $("#myInput").on("keyup", function() {
-    var value = $(this).val().toLowerCase();
-    $("#myList li").filter(function() {
-      $(this).toggle($(this).text().toLowerCase().indexOf(value) > -1)
-    });
-  });
-});
-
 $(document).ready(function(){
   $("#myInputSymptom").on("keyup", function() {
     var value = $(this).val().toLowerCase();
@@ -43,29 +34,6 @@ $(document).ready(function(){
   });
 });
 
-$(document).ready(function(){
-  $("#searchInput").on("keyup", function() {
-    var value = $(this).val().toLowerCase();
-    $("#searchList li").each( function() {
-      let text = $(this).attr('data-name').toLowerCase();
-      if (text.includes(value)) {
-        $(this).show();
-      } else {
-        $(this).hide();
-      }
-    })
-  });
-});
-
-$(document).ready(function(){
-  $("#myInput").on("keyup", function() {
-    var value = $(this).val().toLowerCase();
-    $("#myTable td").filter(function() {
-      $(this).toggle($(this).text().toLowerCase().indexOf(value) > -1)
-    });
-  });
-});
-
 $(document).ready(function(){
   $("#myInput2").on("keyup", function() {
     var value = $(this).val().toLowerCase();
@@ -92,13 +60,6 @@ $(document).ready(function(){
 });
 
 
-function toggle(source) {
-  checkboxes = document.getElementsByName('geographical_area');
-  for(let i=0, n=checkboxes.length; i<n; i++) {
-    checkboxes[i].checked = source.checked;
-  }
-}
-
 
 const links = document.querySelectorAll("a.image");
 const lightbox = document.querySelector(".lightbox");
@@ -125,3 +86,46 @@ lightbox.addEventListener('click', e => {
 lightboxCtn.addEventListener('click', e => {
     e.stopPropagation();
 });
+
+$(document).ready(function(){
+  $(".typeahead").each(function() {
+    const widget = $(this);
+    const suggestions = widget.find(".typeahead-suggestions");
+    const selected = widget.find(".typeahead-selected");
+    let timer = null;
+    let request = null;
+
+    widget.find(".typeahead-input").on("input", function() {
+      const query = $(this).val();
+      clearTimeout(timer);
+      timer = setTimeout(function() {
+        if (request) {
+          request.abort();
+        }
+        if (!query.trim()) {
+          suggestions.empty();
+          return;
+        }
+        request = $.getJSON(widget.data("url"), {q: query}, function(data) {
+          suggestions.empty();
+          data.results.forEach(function(item) {
+            $("<li>").text(item.name).attr("data-id", item.id).appendTo(suggestions);
+          });
+        });
+      }, 150);
+    });
+
+    suggestions.on("click", "li", function() {
+      const id = String($(this).data("id"));
+      const exists = selected.find("input").filter(function() { return this.value === id; });
+      if (exists.length) {
+        exists.prop("checked", true);
+      } else {
+        const checkbox = $("<input type='checkbox' checked>").attr({name: widget.data("name"), value: id});
+        $("<li>").append($("<label>").append(checkbox, " ", $(this).text())).appendTo(selected);
+      }
+      suggestions.empty();
+      widget.find(".typeahead-input").val("").focus();
+    });
+  });
+});